@@ -0,0 +1,451 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from typing import Callable, DefaultDict, Dict, List, Optional, Tuple
+
+import numpy as np
+from hypothesis import HealthCheck, given
+from hypothesis import seed as fix_seed
+from hypothesis import settings
+from hypothesis import strategies as st
+from thefuzz import fuzz  # type: ignore
+
+from cw_ngrams import load_words_and_freqs, run_scenarios
+from cw_ngrams.cw import ALPHABET
+from cw_ngrams.data import Affix
+from cw_ngrams.difficulty import difficulty
+from cw_ngrams.external import (
+    aggregate_affixes,
+    find_examples_streaming,
+    max_entries_from_memory,
+    top_affixes,
+)
+from cw_ngrams.pipeline import DEFAULT_SCENARIO
+from cw_ngrams.shared import SharedCorpus
+
+# Runtime budgets, in seconds, on the large synthetic corpus; about 1.5 times the best of five
+# runs on a development machine, so that real regressions don't go unnoticed
+BUDGETS = {
+    "run_scenarios": 1.5,
+    "top_affixes": 1.0,
+    "find_examples_streaming": 0.3,
+}
+N_RUNS = 5
+
+
+def random_corpus(rng: random.Random, n_words: int, alphabet: str) -> List[Tuple[str, int]]:
+    """
+    Generate words and frequencies, most frequent first.
+
+    A small alphabet makes affixes collide often, and a small range of frequencies makes ties
+    common, which is where the optimized paths are most likely to disagree with the reference.
+    """
+
+    words = {
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 9))) for _ in range(n_words)
+    }
+    corpus = [(word, rng.randint(1, 20)) for word in sorted(words)]
+    rng.shuffle(corpus)
+    return sorted(corpus, key=lambda x: -x[1])
+
+
+def write_corpus(corpus: List[Tuple[str, int]], path: str) -> None:
+    with open(path, "w") as f:
+        f.writelines(f"{word}\t{freq}\n" for word, freq in corpus)
+
+
+# Words from a small alphabet make affixes collide often, and a small range of frequencies makes
+# ties common, which is where the optimized paths are most likely to disagree with the reference.
+# Left to itself, Hypothesis mostly generates a handful of words, too few for any affix to have
+# enough examples to filter for similarity; a few dozen words still shrink quickly on failure.
+corpora = st.lists(
+    st.tuples(st.text("abcde", min_size=1, max_size=9), st.integers(1, 20)),
+    min_size=10,
+    max_size=60,
+    unique_by=lambda x: x[0],
+).map(lambda corpus: sorted(corpus, key=lambda x: -x[1]))
+
+
+@st.composite
+def scenario_dicts(draw: Callable) -> Dict:
+    affix_type = draw(st.sampled_from(["prefixes", "suffixes", None]))
+    similarity = draw(st.sampled_from(["similar", "dissimilar", None]))
+    ordering = draw(st.sampled_from(["sort", "difficulty", None]))
+    return {
+        **DEFAULT_SCENARIO,
+        "ngram_length": draw(st.integers(1, 4)),
+        "n_affixes": draw(st.integers(1, 20)),
+        "n_examples": draw(st.integers(0, 5)),
+        "sort": ordering == "sort",
+        "difficulty": ordering == "difficulty",
+        "shuffle": draw(st.booleans()),
+        "prefixes": affix_type == "prefixes",
+        "suffixes": affix_type == "suffixes",
+        "similar": similarity == "similar",
+        "dissimilar": similarity == "dissimilar",
+        "weighted": draw(st.sampled_from([0, 0.5, 2])),
+        "min_word_length": draw(st.sampled_from([None, 0, 3, 5])),
+        "max_word_length": draw(st.sampled_from([None, 4, 6, 8])),
+    }
+
+
+# The reference implementation : a frozen copy of the in-memory functions in cw_ngrams/data.py
+# and cw_ngrams/output.py, as they were before any optimization, quirks included. Optimizing the
+# library must never touch this copy; it is what every optimized path is checked against.
+
+
+def _reference_weight(string: str) -> int:
+    cw_string = "".join([ALPHABET[char.upper()] for char in string])
+    return cw_string.count(".") + cw_string.count("-") * 3
+
+
+def reference_construct_affixes(
+    words: List[str], freqs: List[int], ngram_length: int
+) -> Tuple[List[Affix], List[Affix]]:
+    prefixes: DefaultDict[str, int] = defaultdict(int)
+    suffixes: DefaultDict[str, int] = defaultdict(int)
+    for word, freq in zip(words, freqs):
+        if len(word) > ngram_length:
+            prefixes[word[:ngram_length]] += freq
+            suffixes[word[-ngram_length:]] += freq
+    return sorted(prefixes.items(), key=lambda x: -x[1]), sorted(
+        suffixes.items(), key=lambda x: -x[1]
+    )
+
+
+def reference_merge_affixes(
+    prefixes: List[Affix],
+    suffixes: List[Affix],
+    only_prefixes: bool,
+    only_suffixes: bool,
+    shuffle: bool,
+) -> List[Affix]:
+    if only_prefixes:
+        all_affixes = prefixes
+    elif only_suffixes:
+        all_affixes = suffixes
+    else:
+        all_affixes = sorted(prefixes + suffixes, key=lambda x: -x[1])
+    unique_affixes_dict: DefaultDict[str, int] = defaultdict(int)
+    for affix, freq in all_affixes:
+        unique_affixes_dict[affix] += freq
+    unique_affixes = list(unique_affixes_dict.items())
+    if shuffle:
+        unique_affixes = random.sample(unique_affixes[:300], k=min(300, len(unique_affixes)))
+    return unique_affixes
+
+
+def reference_weight_affixes(affixes: List[Affix], weighted: float) -> List[Affix]:
+    if weighted == 0:
+        return affixes
+    for idx in range(len(affixes)):
+        affix, freq = affixes[idx]
+        affixes[idx] = (affix, freq / (_reference_weight(affix) ** weighted))
+    return sorted(affixes, key=lambda x: -x[1])
+
+
+def reference_filter_examples(
+    examples: Dict[str, List[str]], n_examples: int, similar: bool, dissimilar: bool
+) -> Dict[str, List[str]]:
+    if similar or dissimilar:
+        for affix, affix_examples in examples.items():
+            similarities = np.zeros((len(affix_examples), len(affix_examples)))
+            for i, first_example in enumerate(affix_examples):
+                for j, second_example in enumerate(affix_examples):
+                    if i == j:
+                        continue
+                    similarities[i, j] = fuzz.ratio(first_example, second_example)
+            if similar:
+                idx = np.argsort(-similarities.sum(0))[:n_examples]
+            else:
+                idx = np.argsort(similarities.sum(0))[:n_examples]
+            examples[affix] = [affix_examples[i] for i in idx]
+    return examples
+
+
+def reference_find_examples(
+    words: List[str],
+    affixes: List[Affix],
+    n_affixes: int,
+    n_examples: int,
+    only_prefixes: bool,
+    only_suffixes: bool,
+    min_example_length: Optional[int],
+    max_example_length: Optional[int],
+    similar: bool,
+    dissimilar: bool,
+) -> Dict[str, List[str]]:
+    if only_prefixes:
+        match = lambda affix, word: word.startswith(affix)
+    elif only_suffixes:
+        match = lambda affix, word: word.endswith(affix)
+    else:
+        match = lambda affix, word: word.startswith(affix) or word.endswith(affix)
+
+    target_n_examples = n_examples * 3 if similar or dissimilar else n_examples
+    all_examples = defaultdict(list)
+    n_affixes_found = 0
+    for affix in affixes:
+        for word in words:
+            if len(word) <= len(affix[0]):
+                continue
+            if min_example_length and (len(word) < min_example_length):
+                continue
+            if max_example_length and (len(word) > max_example_length):
+                continue
+            if match(affix[0], word):
+                all_examples[affix[0]].append(word)
+                if len(all_examples[affix[0]]) == target_n_examples:
+                    n_affixes_found += 1
+                    break
+        if n_affixes_found == n_affixes:
+            break
+
+    examples = {
+        key: value for key, value in all_examples.items() if len(value) == target_n_examples
+    }
+    return reference_filter_examples(examples, n_examples, similar, dissimilar)
+
+
+def reference_output(
+    examples: Dict[str, List[str]],
+    sort_length: bool,
+    word_scores: Optional[Dict[str, float]] = None,
+    affix_scores: Optional[Dict[str, float]] = None,
+) -> List[str]:
+    affixes = list(examples)
+    if affix_scores is not None:
+        affixes = sorted(affixes, key=lambda affix: affix_scores[affix])  # type: ignore
+    output = []
+    for affix in affixes:
+        affix_examples = examples[affix]
+        if sort_length:
+            affix_examples = sorted(affix_examples, key=lambda x: len(x))
+        if word_scores is not None:
+            affix_examples = sorted(affix_examples, key=lambda x: word_scores[x])  # type: ignore
+        output.append(f"{affix.upper()} - {', '.join(affix_examples).upper()}")
+        if sort_length:
+            output = sorted(output, key=lambda x: len(x))
+    return output
+
+
+def reference(words: List[str], freqs: List[int], scenarios: List[Dict]) -> List[List[str]]:
+    """
+    Run scenarios through the reference implementation, one step after the other.
+
+    Scenarios with the same n-gram length, affix type and shuffling share their merged affixes,
+    and so the same random sample, like in `run_scenarios`.
+    """
+
+    merged: Dict[Tuple, List[Affix]] = {}
+    outputs = []
+    for scenario_ in scenarios:
+        scenario = {**DEFAULT_SCENARIO, **scenario_}
+        merge_key = tuple(
+            scenario[key] for key in ["ngram_length", "prefixes", "suffixes", "shuffle"]
+        )
+        if merge_key not in merged:
+            prefixes, suffixes = reference_construct_affixes(
+                words, freqs, scenario["ngram_length"]
+            )
+            merged[merge_key] = reference_merge_affixes(
+                prefixes, suffixes, scenario["prefixes"], scenario["suffixes"], scenario["shuffle"]
+            )
+        affixes = merged[merge_key]
+
+        word_scores = affix_scores = None
+        if scenario["difficulty"]:
+            word_scores = dict(zip(words, difficulty(words, freqs).tolist()))
+            scores = difficulty([affix for affix, _ in affixes], [freq for _, freq in affixes])
+            affix_scores = dict(zip([affix for affix, _ in affixes], scores.tolist()))
+
+        examples = reference_find_examples(
+            words,
+            reference_weight_affixes(list(affixes), scenario["weighted"]),
+            scenario["n_affixes"],
+            scenario["n_examples"],
+            scenario["prefixes"],
+            scenario["suffixes"],
+            scenario["min_word_length"],
+            scenario["max_word_length"],
+            scenario["similar"],
+            scenario["dissimilar"],
+        )
+        outputs.append(reference_output(examples, scenario["sort"], word_scores, affix_scores))
+    return outputs
+
+
+@given(corpora, st.integers(1, 4), st.sampled_from([1, 7]))
+def check_aggregation(corpus: List[Tuple[str, int]], ngram_length: int, max_entries: int) -> None:
+    """
+    Check that spilling and merging sorted runs gives the same affix counts as the reference.
+
+    A single entry per run makes hundreds of runs, which are merged in several passes.
+    """
+
+    words = [word for word, _ in corpus]
+    freqs = [freq for _, freq in corpus]
+    prefixes, suffixes = reference_construct_affixes(words, freqs, ngram_length)
+    expected = {affix: (freq, 0) for affix, freq in prefixes}
+    for affix, freq in suffixes:
+        expected[affix] = (expected.get(affix, (0, 0))[0], freq)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "corpus.txt")
+        write_corpus(corpus, path)
+        counts = {
+            affix: (prefix_count, suffix_count)
+            for affix, prefix_count, _, suffix_count, _ in aggregate_affixes(
+                path, ngram_length, max_entries, directory
+            )
+        }
+    assert counts == expected
+
+
+@given(corpora, st.lists(scenario_dicts(), min_size=1, max_size=10), st.integers(0, 2**32 - 1))
+def check_equivalence(
+    corpus: List[Tuple[str, int]], scenarios: List[Dict], random_seed: int
+) -> None:
+    """
+    Compare the optimized paths with the reference on a corpus and a batch of scenarios.
+
+    Every path starts from the same random state, so shuffled scenarios must draw the same
+    samples as the reference.
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "corpus.txt")
+        write_corpus(corpus, path)
+        words, freqs = load_words_and_freqs(path)
+
+        random.seed(random_seed)
+        expected = reference(words, freqs, scenarios)
+        random.seed(random_seed)
+        assert run_scenarios(scenarios, path) == expected, "run_scenarios differs"
+        with SharedCorpus.publish(words, freqs, range(1, 3)) as shared_corpus:
+            random.seed(random_seed)
+            assert run_scenarios(scenarios, corpus=shared_corpus) == expected, "shared differs"
+
+        # The out-of-core path can't order by difficulty
+        scenarios = [{**scenario, "difficulty": False} for scenario in scenarios]
+        random.seed(random_seed)
+        expected = reference(words, freqs, scenarios)
+        random.seed(random_seed)
+        assert run_scenarios(scenarios, path, max_memory_mb=16) == expected, "streaming differs"
+
+
+def check_truncation(seed: int) -> None:
+    """
+    Check the out-of-core path when the memory budget only holds part of the affix list.
+
+    The affix list is then truncated to the affixes that fit, so scenarios asking for more
+    affixes than that get fewer lines; those must be the first lines of the reference output.
+    """
+
+    rng = random.Random(seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "corpus.txt")
+        write_corpus(random_corpus(rng, 4500, "etaoinshrdlucmfwyp"), path)
+        words, freqs = load_words_and_freqs(path)
+
+        max_entries = max_entries_from_memory(1)
+        prefixes, suffixes = reference_construct_affixes(words, freqs, 4)
+        assert len(reference_merge_affixes(prefixes, suffixes, False, False, False)) > max_entries
+
+        for weighted in [0, 2]:
+            scenario = {
+                **DEFAULT_SCENARIO,
+                "ngram_length": 4,
+                "n_affixes": 2 * max_entries,
+                "n_examples": 1,
+                "weighted": weighted,
+            }
+            (expected,) = reference(words, freqs, [scenario])
+            (output,) = run_scenarios([scenario], path, max_memory_mb=1)
+            message = f"(seed {seed}, scenario {scenario})"
+            assert len(output) < len(expected), f"streaming wasn't truncated {message}"
+            assert output == expected[: len(output)], f"truncated streaming differs {message}"
+
+    print(f"Truncation : out-of-core path keeps the top {max_entries} affixes, OK")
+
+
+def timed(name: str, function: Callable, budget_scale: float) -> None:
+    """
+    Time the best of a few runs, which is much less noisy than a single one.
+    """
+
+    elapsed = []
+    for _ in range(N_RUNS):
+        start = time.perf_counter()
+        function()
+        elapsed.append(time.perf_counter() - start)
+
+    budget = BUDGETS[name] * budget_scale
+    assert min(elapsed) <= budget, f"{name} took {min(elapsed):.2f}s; budget {budget:.2f}s"
+    print(f"Runtime : {name} took {min(elapsed):.2f}s of {budget:.2f}s")
+
+
+def check_runtime(n_words: int, seed: int, budget_scale: float) -> None:
+    """
+    Check that the optimized paths stay within their budgets on a large synthetic corpus.
+    """
+
+    rng = random.Random(seed)
+    scenarios = [
+        {**DEFAULT_SCENARIO, "ngram_length": ngram_length, "n_affixes": 50, **variant}
+        for ngram_length in range(2, 5)
+        for variant in [{}, {"prefixes": True}, {"suffixes": True, "sort": True}]
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "corpus.txt")
+        write_corpus(random_corpus(rng, n_words, "etaoinshrdlu"), path)
+
+        # Keep the budget small enough that aggregation has to spill to disk
+        assert max_entries_from_memory(1) < 12**4
+
+        timed("run_scenarios", lambda: run_scenarios(scenarios, path), budget_scale)
+        affixes = top_affixes(path, 4, False, False, False, 0, 1)
+        timed("top_affixes", lambda: top_affixes(path, 4, False, False, False, 0, 1), budget_scale)
+        timed(
+            "find_examples_streaming",
+            lambda: find_examples_streaming(
+                path, affixes, 50, 10, False, False, None, None, False, False
+            ),
+            budget_scale,
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_trials", type=int, default=50, help="Examples per property.")
+    parser.add_argument("--n_words", type=int, default=100000, help="Size of the large corpus.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated examples.")
+    parser.add_argument(
+        "--budget_scale", type=float, default=1.0, help="Scale runtime budgets on slow machines."
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # Time the optimized paths first, before the examples below fill up memory
+    check_runtime(args.n_words, args.seed, args.budget_scale)
+
+    # Checks are run from here rather than by pytest, so settings are applied explicitly
+    check_settings = settings(
+        max_examples=args.n_trials,
+        deadline=None,
+        suppress_health_check=[HealthCheck.too_slow, HealthCheck.data_too_large],
+    )
+    check_settings(fix_seed(args.seed)(check_aggregation))()
+    print(f"Aggregation : {args.n_trials} examples, OK")
+    check_settings(fix_seed(args.seed)(check_equivalence))()
+    print(f"Equivalence : {args.n_trials} examples, OK")
+
+    check_truncation(args.seed)
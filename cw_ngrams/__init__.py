@@ -6,4 +6,8 @@ from cw_ngrams.data import (
     merge_affixes,
     weight_affixes,
 )
+from cw_ngrams.jobs import JobQueue, load_result
 from cw_ngrams.output import make_output
+from cw_ngrams.pipeline import run_scenarios
+from cw_ngrams.scheduler import Scheduler
+from cw_ngrams.shared import SharedCorpus
@@ -1,5 +1,7 @@
 import argparse
 
+from .data import DATA_PATH
+
 
 def validate_ngram_length(ngram_length_: str) -> int:
     """
@@ -33,6 +35,16 @@ def validate_n_affixes(n_affixes_: str) -> int:
     return n_affixes
 
 
+def validate_max_memory_mb(max_memory_mb_: str) -> int:
+    """
+    Validate that the max_memory_mb argument is valid : greater than 0.
+    """
+    max_memory_mb = int(max_memory_mb_)
+    if max_memory_mb <= 0:
+        raise argparse.ArgumentTypeError("max_memory_mb must be > 0.")
+    return max_memory_mb
+
+
 def parse_args() -> argparse.Namespace:
     """
     Parse command line arguments.
@@ -75,13 +87,23 @@ def parse_args() -> argparse.Namespace:
         help="Only return suffixes and their examples.",
     )
 
-    # Whether to return the examples sorted by length
-    parser.add_argument(
+    # Whether to return the examples sorted by length, or by how hard they are to copy
+    ordering = parser.add_mutually_exclusive_group()
+    ordering.add_argument(
         "--sort",
         action="store_true",
         dest="sort_length",
         help="Sort the affixes and their examples by word length.",
     )
+    ordering.add_argument(
+        "--difficulty",
+        action="store_true",
+        dest="sort_difficulty",
+        help=(
+            "Sort the affixes and their examples from easiest to hardest to copy, based on "
+            "their Morse duration, how confusable their characters are, and their frequency."
+        ),
+    )
 
     # Whether to select random affixes, or in frequency order
     parser.add_argument(
@@ -125,5 +147,27 @@ def parse_args() -> argparse.Namespace:
         ),
     )
 
+    # Where to read words from, and how much memory to use while doing so
+    parser.add_argument(
+        "--corpus",
+        default=DATA_PATH,
+        dest="corpus_path",
+        help=f"A tab-separated file of words and their counts; defaults to {DATA_PATH}.",
+    )
+    parser.add_argument(
+        "--max_memory_mb",
+        type=validate_max_memory_mb,
+        default=None,
+        help=(
+            "If set, stream the corpus from disk and aggregate affixes within roughly this "
+            "much memory, for corpora too large to load at once."
+        ),
+    )
+
     args = parser.parse_args()
+
+    # Difficulty scores need the whole corpus in memory
+    if args.sort_difficulty and args.max_memory_mb is not None:
+        parser.error("argument --difficulty: not allowed with argument --max_memory_mb")
+
     return args
@@ -25,6 +25,16 @@ ALPHABET = {
     "X": "-..-",
     "Y": "-.--",
     "Z": "--..",
+    "0": "-----",
+    "1": ".----",
+    "2": "..---",
+    "3": "...--",
+    "4": "....-",
+    "5": ".....",
+    "6": "-....",
+    "7": "--...",
+    "8": "---..",
+    "9": "----.",
 }
 
 
@@ -1,6 +1,8 @@
+import hashlib
+import os
 import random
 from collections import defaultdict
-from typing import DefaultDict, Dict, List, Optional, Tuple
+from typing import Callable, DefaultDict, Dict, Iterable, List, Optional, Sequence, Tuple
 
 import numpy as np
 from thefuzz import fuzz  # type: ignore
@@ -9,11 +11,21 @@ from .cw import str_to_weight
 
 Affix = Tuple[str, int]
 
+# A progress callback, called with the name of a stage, the work done, and the total work
+Progress = Callable[[str, int, int], None]
 
-def load_words_and_freqs() -> Tuple[List[str], List[int]]:
+DATA_PATH = "data/most_common_words.txt"
+
+
+def load_words_and_freqs(path: str = DATA_PATH) -> Tuple[List[str], List[int]]:
     """
     Load the words and their frequencies from the data file.
 
+    Parameters
+    ----------
+    path : str
+        The path to a tab-separated file of words and their counts, most frequent first.
+
     Returns
     -------
     List[str]
@@ -22,7 +34,7 @@ def load_words_and_freqs() -> Tuple[List[str], List[int]]:
         The frequencies (counts) of the words.
     """
 
-    with open("data/most_common_words.txt", "r") as f:
+    with open(path, "r") as f:
         lines = f.readlines()
 
     # Separate the words and their frequencies; clean line endings
@@ -35,8 +47,30 @@ def load_words_and_freqs() -> Tuple[List[str], List[int]]:
     return words, freqs
 
 
+def corpus_fingerprint(path: str = DATA_PATH) -> str:
+    """
+    Identify the contents of a data file, so that results computed from it can be reused.
+
+    Parameters
+    ----------
+    path : str
+        The path to the data file.
+
+    Returns
+    -------
+    str
+        The size of the file and a hash of its contents; any edit to the file changes it.
+    """
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"{os.path.getsize(path)}-{digest.hexdigest()}"
+
+
 def construct_affixes(
-    words: List[str], freqs: List[int], ngram_length: int
+    words: Iterable[str], freqs: Iterable[int], ngram_length: int
 ) -> Tuple[List[Affix], List[Affix]]:
     """
     Construct prefixes and suffixes.
@@ -45,9 +79,9 @@ def construct_affixes(
 
     Parameters
     ----------
-    words : List[str]
+    words : Iterable[str]
         A list of words.
-    freqs : List[int]
+    freqs : Iterable[int]
         A list of word frequencies.
     ngram_length : int
         The length of the affixes to construct.
@@ -78,8 +112,8 @@ def construct_affixes(
 
 
 def merge_affixes(
-    prefixes: List[Affix],
-    suffixes: List[Affix],
+    prefixes: Sequence[Affix],
+    suffixes: Sequence[Affix],
     only_prefixes: bool,
     only_suffixes: bool,
     shuffle: bool,
@@ -91,9 +125,9 @@ def merge_affixes(
 
     Parameters
     ----------
-    prefixes : List[Affix]
+    prefixes : Sequence[Affix]
         The prefixes and their frequencies.
-    suffixes : List[Affix]
+    suffixes : Sequence[Affix]
         The suffixes and their frequencies.
     only_prefixes : bool
         Whether to only include prefixes in the combined list.
@@ -114,7 +148,7 @@ def merge_affixes(
     elif only_suffixes:
         all_affixes = suffixes
     else:
-        all_affixes = sorted(prefixes + suffixes, key=lambda x: -x[1])
+        all_affixes = sorted([*prefixes, *suffixes], key=lambda x: -x[1])
 
     # Ensure affixes are unique; perform a group-by
     unique_affixes_dict: DefaultDict[str, int] = defaultdict(int)
@@ -147,6 +181,7 @@ def _filter_examples(
     n_examples: int,
     similar: bool,
     dissimilar: bool,
+    progress: Optional[Progress] = None,
 ) -> Dict[str, List[str]]:
     """
     Filter examples for similiar or dissimilar words.
@@ -161,6 +196,8 @@ def _filter_examples(
         Whether to return example words that are similar to one another.
     dissimilar : bool
         Whether to return example words that are dissimilar to one another.
+    progress : Optional[Progress]
+        If given, called with "filter" after each affix is filtered.
 
     Returns
     -------
@@ -172,7 +209,7 @@ def _filter_examples(
         raise ValueError("Cannot keep both similar and dissimilar words.")
 
     if similar or dissimilar:
-        for affix, affix_examples in examples.items():
+        for n_filtered, (affix, affix_examples) in enumerate(examples.items(), start=1):
 
             similarities = np.zeros((len(affix_examples), len(affix_examples)))
             for i, first_example in enumerate(affix_examples):
@@ -188,11 +225,14 @@ def _filter_examples(
 
             examples[affix] = [affix_examples[i] for i in idx]
 
+            if progress is not None:
+                progress("filter", n_filtered, len(examples))
+
     return examples
 
 
 def find_examples(
-    words: List[str],
+    words: Sequence[str],
     affixes: List[Affix],
     n_affixes: int,
     n_examples: int,
@@ -202,13 +242,14 @@ def find_examples(
     max_example_length: Optional[int],
     similar: bool,
     dissimilar: bool,
+    progress: Optional[Progress] = None,
 ) -> Dict[str, List[str]]:
     """
     Find a list of examples that match the affixes.
 
     Parameters
     ----------
-    words : List[str]
+    words : Sequence[str]
         The words from which to find examples.
     affixes : List[Affix]
         The affixes and their frequencies.
@@ -218,6 +259,9 @@ def find_examples(
         Whether to only search for words that match prefixes.
     only_suffixes : bool
         Whether to only search for words that match suffixes.
+    progress : Optional[Progress]
+        If given, called with "examples" after each affix is searched, with the number of affixes
+        found so far out of `n_affixes`, and with "filter" while filtering examples.
 
     Returns
     -------
@@ -269,6 +313,9 @@ def find_examples(
                     n_affixes_found += 1
                     break
 
+        if progress is not None:
+            progress("examples", n_affixes_found, n_affixes)
+
         # If we've found sufficient affixes, stop looking for more examples
         if n_affixes_found == n_affixes:
             break
@@ -279,6 +326,6 @@ def find_examples(
     }
 
     # Filter out examples that are too similar or too dissimilar if requested
-    examples = _filter_examples(examples, n_examples, similar, dissimilar)
+    examples = _filter_examples(examples, n_examples, similar, dissimilar, progress)
 
     return examples
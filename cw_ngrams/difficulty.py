@@ -0,0 +1,160 @@
+import os
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+from .cw import ALPHABET
+from .data import corpus_fingerprint
+
+# Standard Morse timing, in dits : a dah is three dits, elements within a character are
+# separated by one dit, and characters by three
+DIT = 1
+DAH = 3
+ELEMENT_GAP = 1
+CHARACTER_GAP = 3
+
+# How much confusable characters and rare words add to the difficulty, relative to duration
+CONFUSION_WEIGHT = 1.0
+RARITY_WEIGHT = 3.0
+
+# Lookup tables cover ASCII; every code point from here on is outside the alphabet
+UNKNOWN_CHAR = 128
+
+
+def _edit_distance(first: str, second: str) -> int:
+    distances = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, start=1):
+        previous, distances[0] = distances[0], i
+        for j, second_char in enumerate(second, start=1):
+            previous, distances[j] = distances[j], min(
+                distances[j] + 1, distances[j - 1] + 1, previous + (first_char != second_char)
+            )
+    return distances[-1]
+
+
+def _char_table(values: Dict[str, float]) -> np.ndarray:
+    """
+    Make a lookup table indexed by code point, for both cases, up to UNKNOWN_CHAR.
+
+    Characters outside the alphabet, like "é" or "'", take the highest value in the table : they
+    have no Morse code of their own, so they are at least as hard to copy as any character that
+    does. Padding (code point zero) maps to zero.
+    """
+    table = np.full(UNKNOWN_CHAR + 1, max(values.values()))
+    table[0] = 0
+    for char, value in values.items():
+        table[ord(char.upper())] = value
+        table[ord(char.lower())] = value
+    return table
+
+
+# The duration of each character
+DURATION = _char_table(
+    {
+        char: code.count(".") * DIT + code.count("-") * DAH + (len(code) - 1) * ELEMENT_GAP
+        for char, code in ALPHABET.items()
+    }
+)
+
+# How many other characters sound almost the same : one element away, like S, H and 5
+CONFUSION = _char_table(
+    {
+        char: sum(
+            _edit_distance(code, other_code) == 1
+            for other_char, other_code in ALPHABET.items()
+            if other_char != char
+        )
+        for char, code in ALPHABET.items()
+    }
+)
+
+
+def difficulty(strings: Sequence[str], freqs: Iterable[int]) -> np.ndarray:
+    """
+    Score how hard words or affixes are to copy by ear.
+
+    The score adds up the Morse duration of the string, in dits, how confusable its characters
+    are with others that sound nearly the same, and how rare it is compared to the most frequent
+    string given. Characters outside the alphabet count as the longest and most confusable
+    character. Scores are computed for all strings at once.
+
+    Parameters
+    ----------
+    strings : Sequence[str]
+        Words or affixes.
+    freqs : Iterable[int]
+        Their frequencies.
+
+    Returns
+    -------
+    np.ndarray
+        The difficulty of each string; the higher, the harder.
+    """
+
+    if len(strings) == 0:
+        return np.zeros(0)
+
+    # Lay strings out as a matrix of code points, padded with zeros, so that lengths count
+    # characters rather than bytes
+    encoded = np.array(strings, dtype=str)
+    codes = encoded.view(np.uint32).reshape(len(encoded), -1)
+    lengths = (codes != 0).sum(1)
+    chars = np.minimum(codes, UNKNOWN_CHAR)
+
+    duration = DURATION[chars].sum(1) + CHARACTER_GAP * np.maximum(lengths - 1, 0)
+    confusion = CONFUSION[chars].sum(1)
+
+    freqs_ = np.maximum(np.fromiter(freqs, dtype=np.float64, count=len(encoded)), 1)
+    rarity = np.log(freqs_.max() / freqs_)
+
+    return duration + CONFUSION_WEIGHT * confusion + RARITY_WEIGHT * rarity
+
+
+def difficulty_path(corpus_path: str) -> str:
+    """
+    The path to the precomputed difficulties of a corpus, stored next to it.
+    """
+    return f"{corpus_path}.difficulty.npz"
+
+
+def load_difficulties(corpus_path: str, words: List[str], freqs: List[int]) -> np.ndarray:
+    """
+    Load the difficulty of each word in a corpus, computing and saving them if needed.
+
+    Difficulties are stored next to the corpus with its fingerprint, and recomputed if the
+    corpus has changed since. If they can't be stored, they are still returned.
+
+    Parameters
+    ----------
+    corpus_path : str
+        The path to the data file.
+    words : List[str]
+        The words in the data file.
+    freqs : List[int]
+        Their frequencies.
+
+    Returns
+    -------
+    np.ndarray
+        The difficulty of each word, in the same order as the words.
+    """
+
+    path = difficulty_path(corpus_path)
+    fingerprint = corpus_fingerprint(corpus_path)
+    if os.path.exists(path):
+        with np.load(path) as stored:
+            difficulties, stored_fingerprint = stored["difficulties"], str(stored["fingerprint"])
+        if stored_fingerprint == fingerprint and len(difficulties) == len(words):
+            return difficulties
+
+    difficulties = difficulty(words, freqs)
+
+    # Write to a temporary file first so readers never see half; if the corpus's directory isn't
+    # writable, the scores are simply computed again next time
+    try:
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(f, difficulties=difficulties, fingerprint=np.array(fingerprint))
+        os.replace(f"{path}.tmp", path)
+    except OSError:
+        pass
+    return difficulties
@@ -0,0 +1,382 @@
+import heapq
+import os
+import random
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .cw import str_to_weight
+from .data import Affix, Progress, _filter_examples, weight_affixes
+
+# A rough upper bound on the memory used by one entry of an in-memory affix table
+BYTES_PER_ENTRY = 256
+
+# The maximum number of runs to merge at once, to stay well within open file limits
+MAX_FAN_IN = 64
+
+# Missing prefix or suffix; otherwise, the index of the first word the affix was found in
+MISSING = -1
+
+# An affix with its prefix count and first occurence, and its suffix count and first occurence
+AffixCounts = Tuple[str, int, int, int, int]
+
+
+def max_entries_from_memory(max_memory_mb: int) -> int:
+    """
+    Convert a memory budget into a maximum number of affixes to hold in memory at once.
+    """
+    return max(1, max_memory_mb * 2**20 // BYTES_PER_ENTRY)
+
+
+def read_corpus(path: str) -> Iterator[Tuple[str, int]]:
+    """
+    Stream words and their frequencies from a data file, one line at a time.
+
+    Parameters
+    ----------
+    path : str
+        The path to a tab-separated file of words and their counts, most frequent first.
+
+    Yields
+    ------
+    Tuple[str, int]
+        A word and its frequency.
+    """
+
+    with open(path, "r") as f:
+        for line in f:
+            word, freq = line.strip().split("\t")[:2]
+            yield word, int(freq)
+
+
+def _spill(table: Dict[str, List[int]], directory: str, n_runs: int) -> str:
+    """
+    Write an affix table to disk as a run sorted by affix, and return its path.
+    """
+
+    run_path = os.path.join(directory, f"run_{n_runs}.tsv")
+    with open(run_path, "w") as f:
+        for affix in sorted(table):
+            f.write("\t".join([affix] + [str(value) for value in table[affix]]) + "\n")
+    return run_path
+
+
+def _write_run(counts: Iterable[AffixCounts], directory: str, n_runs: int) -> str:
+    """
+    Write affix counts, already sorted by affix, to disk as a run, and return its path.
+    """
+
+    run_path = os.path.join(directory, f"run_{n_runs}.tsv")
+    with open(run_path, "w") as f:
+        for affix_counts in counts:
+            f.write("\t".join(str(value) for value in affix_counts) + "\n")
+    return run_path
+
+
+def _read_run(run_path: str) -> Iterator[AffixCounts]:
+    with open(run_path, "r") as f:
+        for line in f:
+            affix, *values = line.rstrip("\n").split("\t")
+            prefix_count, prefix_first, suffix_count, suffix_first = map(int, values)
+            yield affix, prefix_count, prefix_first, suffix_count, suffix_first
+
+
+def _first(first: int, other: int) -> int:
+    if first == MISSING:
+        return other
+    if other == MISSING:
+        return first
+    return min(first, other)
+
+
+def aggregate_affixes(
+    path: str, ngram_length: int, max_entries: int, directory: str
+) -> Iterator[AffixCounts]:
+    """
+    Aggregate affix counts over a corpus that doesn't fit in memory.
+
+    The corpus is read in chunks; each chunk's affix counts are spilled to disk as a run sorted
+    by affix once the table holds `max_entries` affixes. The runs are then merged, summing the
+    counts of each affix; if there are more than `MAX_FAN_IN` runs, they are first merged in
+    groups into longer runs, so that only a bounded number of files are open at once. Along with
+    its counts, we keep the index of the first word each affix was found in, so that ties can be
+    broken in the same order as `construct_affixes`.
+
+    Parameters
+    ----------
+    path : str
+        The path to the data file.
+    ngram_length : int
+        The length of the affixes to construct.
+    max_entries : int
+        The maximum number of affixes to hold in memory at once.
+    directory : str
+        A directory in which to write the sorted runs.
+
+    Yields
+    ------
+    AffixCounts
+        Each affix, in alphabetical order, with its prefix count and first occurence, and its
+        suffix count and first occurence. Missing occurences are marked by `MISSING`.
+    """
+
+    table: Dict[str, List[int]] = {}
+    run_paths: List[str] = []
+
+    for idx, (word, freq) in enumerate(read_corpus(path)):
+
+        # Only extract n-grams from words of length n+1
+        if len(word) <= ngram_length:
+            continue
+
+        prefix = table.setdefault(word[:ngram_length], [0, MISSING, 0, MISSING])
+        prefix[0] += freq
+        prefix[1] = _first(prefix[1], idx)
+
+        suffix = table.setdefault(word[-ngram_length:], [0, MISSING, 0, MISSING])
+        suffix[2] += freq
+        suffix[3] = _first(suffix[3], idx)
+
+        if len(table) >= max_entries:
+            run_paths.append(_spill(table, directory, len(run_paths)))
+            table = {}
+
+    if table:
+        run_paths.append(_spill(table, directory, len(run_paths)))
+        table = {}
+
+    # Merge runs in groups until few enough are left to open them all at once
+    n_runs = len(run_paths)
+    while len(run_paths) > MAX_FAN_IN:
+        merged_paths = []
+        for start in range(0, len(run_paths), MAX_FAN_IN):
+            end = start + MAX_FAN_IN
+            group = run_paths[start:end]
+            merged_paths.append(_write_run(_merge_runs(group), directory, n_runs))
+            n_runs += 1
+            for run_path in group:
+                os.remove(run_path)
+        run_paths = merged_paths
+
+    yield from _merge_runs(run_paths)
+
+
+def _merge_runs(run_paths: List[str]) -> Iterator[AffixCounts]:
+    """
+    Merge sorted runs, summing the counts of each affix; equal affixes come out next to each other.
+    """
+
+    current: Optional[List] = None
+    for affix, prefix_count, prefix_first, suffix_count, suffix_first in heapq.merge(
+        *[_read_run(run_path) for run_path in run_paths]
+    ):
+        if current is not None and current[0] == affix:
+            current[1] += prefix_count
+            current[2] = _first(current[2], prefix_first)
+            current[3] += suffix_count
+            current[4] = _first(current[4], suffix_first)
+            continue
+        if current is not None:
+            yield tuple(current)  # type: ignore
+        current = [affix, prefix_count, prefix_first, suffix_count, suffix_first]
+
+    if current is not None:
+        yield tuple(current)  # type: ignore
+
+
+def _merged_affix(
+    counts: AffixCounts, only_prefixes: bool, only_suffixes: bool
+) -> Optional[Tuple[Tuple[int, int, int], Affix]]:
+    """
+    Compute an affix's position key and frequency in the list returned by `merge_affixes`.
+
+    Returns None if the affix isn't of the desired type.
+    """
+
+    affix, prefix_count, prefix_first, suffix_count, suffix_first = counts
+
+    # Prefixes come before suffixes of the same frequency, and each is in order of occurence
+    entries = []
+    if prefix_first != MISSING and not only_suffixes:
+        entries.append((-prefix_count, 0, prefix_first))
+    if suffix_first != MISSING and not only_prefixes:
+        entries.append((-suffix_count, 1, suffix_first))
+    if not entries:
+        return None
+
+    # The merged list keeps an affix where it first appears, with both frequencies summed
+    freq = (0 if only_suffixes else prefix_count) + (0 if only_prefixes else suffix_count)
+    return min(entries), (affix, freq)
+
+
+def top_affixes(
+    path: str,
+    ngram_length: int,
+    only_prefixes: bool,
+    only_suffixes: bool,
+    shuffle: bool,
+    weighted: float,
+    max_memory_mb: int,
+) -> List[Affix]:
+    """
+    Construct, merge and weight affixes within a fixed memory budget.
+
+    The result matches `construct_affixes`, `merge_affixes` and `weight_affixes`, truncated to
+    the number of affixes that fit in the memory budget.
+
+    Parameters
+    ----------
+    path : str
+        The path to the data file.
+    ngram_length : int
+        The length of the affixes to construct.
+    only_prefixes : bool
+        Whether to only include prefixes.
+    only_suffixes : bool
+        Whether to only include suffixes.
+    shuffle : bool
+        Whether to shuffle the top 300 affixes, rather than return them all in order.
+    weighted : float
+        If > 0, order affixes by CW weight.
+    max_memory_mb : int
+        The memory budget, in megabytes.
+
+    Returns
+    -------
+    List[Affix]
+        The top affixes and their (possibly weighted) frequencies.
+    """
+
+    max_entries = max_entries_from_memory(max_memory_mb)
+
+    with tempfile.TemporaryDirectory() as directory:
+        merged = (
+            _merged_affix(counts, only_prefixes, only_suffixes)
+            for counts in aggregate_affixes(path, ngram_length, max_entries, directory)
+        )
+        candidates = (candidate for candidate in merged if candidate is not None)
+
+        # If we're shuffling, sample from the most common 300 before weighting, as in memory
+        if shuffle:
+            most_common = heapq.nsmallest(300, candidates, key=lambda x: x[0])
+            sample = [affix for _, affix in most_common]
+            return weight_affixes(random.sample(sample, k=len(sample)), weighted)
+
+        if weighted == 0:
+            top = heapq.nsmallest(max_entries, candidates, key=lambda x: x[0])
+            return [affix for _, affix in top]
+
+        # Weighting sorts by weighted frequency, keeping the merged order for ties
+        weighted_candidates = (
+            (key, (affix, freq / (str_to_weight(affix) ** weighted)))
+            for key, (affix, freq) in candidates
+        )
+        top_weighted = heapq.nsmallest(
+            max_entries, weighted_candidates, key=lambda x: (-x[1][1], x[0])
+        )
+        return [affix for _, affix in top_weighted]  # type: ignore
+
+
+def find_examples_streaming(
+    path: str,
+    affixes: List[Affix],
+    n_affixes: int,
+    n_examples: int,
+    only_prefixes: bool,
+    only_suffixes: bool,
+    min_example_length: Optional[int],
+    max_example_length: Optional[int],
+    similar: bool,
+    dissimilar: bool,
+    progress: Optional[Progress] = None,
+) -> Dict[str, List[str]]:
+    """
+    Find a list of examples that match the affixes, streaming words from the data file.
+
+    This returns the same examples as `find_examples`, without holding the words in memory.
+    Affixes are searched for in batches of `n_affixes`, with one pass over the corpus per batch,
+    until enough affixes have sufficient examples. A pass stops early once every affix in its
+    batch has enough examples.
+
+    Parameters
+    ----------
+    path : str
+        The path to the data file.
+    affixes : List[Affix]
+        The affixes and their frequencies, all of the same length.
+    n_affixes : int
+        The number of affixes to find examples for.
+    n_examples : int
+        The number of examples to find for each affix.
+    only_prefixes : bool
+        Whether to only search for words that match prefixes.
+    only_suffixes : bool
+        Whether to only search for words that match suffixes.
+    progress : Optional[Progress]
+        If given, called with "examples" after each batch of affixes is searched, and with
+        "filter" while filtering examples.
+
+    Returns
+    -------
+    Dict[str, List[str]]
+        A dict mapping affixes to a list of examples that match them.
+    """
+
+    # Are we filtering any examples post-match ? If so, we need to find many more examples
+    filters = similar or dissimilar
+    target_n_examples: int = n_examples * 3 if filters else n_examples
+
+    examples: Dict[str, List[str]] = {}
+    if target_n_examples == 0:
+        return examples
+
+    for start in range(0, len(affixes), n_affixes):
+        stop = start + n_affixes
+        batch: Dict[str, List[str]] = {affix: [] for affix, _ in affixes[start:stop]}
+        ngram_length = len(next(iter(batch)))
+        n_full = 0
+
+        for word, _ in read_corpus(path):
+
+            # If a word is not strictly longer than the affix, throw it out
+            if len(word) <= ngram_length:
+                continue
+
+            # If the word matches but is too long or too short, skip it
+            if min_example_length and (len(word) < min_example_length):
+                continue
+            if max_example_length and (len(word) > max_example_length):
+                continue
+
+            # A word that starts and ends with the same affix is only one example of it
+            matches = set()
+            if not only_suffixes:
+                matches.add(word[:ngram_length])
+            if not only_prefixes:
+                matches.add(word[-ngram_length:])
+
+            for affix in matches:
+                if affix in batch and len(batch[affix]) < target_n_examples:
+                    batch[affix].append(word)
+                    n_full += len(batch[affix]) == target_n_examples
+
+            # Stop reading once every affix in the batch has enough examples
+            if n_full == len(batch):
+                break
+
+        # Keep only affixes with sufficient examples, in order, until we have enough
+        for affix, affix_examples in batch.items():
+            if len(affix_examples) == target_n_examples:
+                examples[affix] = affix_examples
+                if len(examples) == n_affixes:
+                    break
+
+        if progress is not None:
+            progress("examples", len(examples), n_affixes)
+
+        if len(examples) == n_affixes:
+            break
+
+    # Filter out examples that are too similar or too dissimilar if requested
+    examples = _filter_examples(examples, n_examples, similar, dissimilar, progress)
+
+    return examples
@@ -0,0 +1,369 @@
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.managers import SyncManager
+from typing import Any, Dict, List, Optional
+
+from .data import DATA_PATH, corpus_fingerprint
+from .pipeline import DEFAULT_SCENARIO, Scenario, run_scenarios
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """
+    Raised from within a running job when it has been cancelled.
+    """
+
+
+def job_id_from_scenario(
+    scenario: Scenario, corpus: str = "", max_memory_mb: Optional[int] = None
+) -> str:
+    """
+    Identify a scenario by a hash of its parameters, the corpus it runs on, and the memory
+    budget it runs within, so that identical scenarios on the same corpus share an id.
+    """
+    parameters = {key: scenario.get(key, value) for key, value in DEFAULT_SCENARIO.items()}
+    identity = {"scenario": parameters, "corpus": corpus, "max_memory_mb": max_memory_mb}
+    return hashlib.sha1(json.dumps(identity, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def load_result(results_dir: str, job_id: str) -> Optional[Dict]:
+    """
+    Load a job's persisted result, or None if it hasn't finished.
+
+    Parameters
+    ----------
+    results_dir : str
+        The directory the job queue writes its results to.
+    job_id : str
+        The id of the job.
+
+    Returns
+    -------
+    Optional[Dict]
+        A dict with the job's "job_id", "scenario", and "output" lines.
+    """
+
+    path = os.path.join(results_dir, f"{job_id}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class Job:
+    """
+    A scenario submitted to the job queue, with its state and progress.
+
+    Progress and cancellation are shared with the worker process running the job through
+    `manager`, so that they can be seen from both sides.
+    """
+
+    def __init__(
+        self, job_id: str, scenario: Scenario, future: asyncio.Future, manager: SyncManager
+    ):
+        self.job_id = job_id
+        self.scenario = scenario
+        self.future = future
+        self.state = QUEUED
+        self.stage: Optional[str] = None
+        self.done = 0
+        self.total = 0
+        self.progress = manager.dict()
+        self.cancelled = manager.Event()
+
+    def update(self) -> None:
+        """
+        Read the latest progress reported by the worker process.
+        """
+        self.stage = self.progress.get("stage", self.stage)
+        self.done = self.progress.get("done", self.done)
+        self.total = self.progress.get("total", self.total)
+
+
+def _run_job(
+    job_id: str,
+    scenario: Scenario,
+    corpus_path: str,
+    max_memory_mb: Optional[int],
+    progress_: Any,
+    cancelled: Any,
+) -> List[str]:
+    """
+    Run a job in a worker process. Progress reports are also where cancellation takes effect.
+    """
+
+    def progress(stage: str, done: int, total: int) -> None:
+        if cancelled.is_set():
+            raise JobCancelled(job_id)
+        progress_.update(stage=stage, done=done, total=total)
+
+    (output,) = run_scenarios([scenario], corpus_path, progress, max_memory_mb=max_memory_mb)
+    return output
+
+
+class JobQueue:
+    """
+    Run scenarios in the background, reporting progress and persisting results to disk.
+
+    Submitting a scenario returns a job id straight away. Identical scenarios submitted while
+    one is queued or running share the same job. Jobs run `run_scenarios` in a pool of worker
+    processes, so that they run in parallel, and their output is written to `results_dir` as
+    JSON once they finish. Only the last `max_finished` finished jobs are kept in memory; older
+    ones are read back from `results_dir`.
+
+    Workers are started with "spawn", which imports the main module again in each of them, so
+    scripts using the queue must guard their entry point with `if __name__ == "__main__":`. Use
+    it as an async context manager :
+
+        async with JobQueue("jobs") as queue:
+            job_id = queue.submit({"ngram_length": 4, "similar": True})
+            output = await queue.result(job_id)
+
+    Parameters
+    ----------
+    results_dir : str
+        The directory to write results to; created if it doesn't exist.
+    n_workers : int
+        The number of jobs to run at once.
+    corpus_path : str
+        The path to the data file.
+    max_memory_mb : Optional[int]
+        If given, stream the corpus from disk within this memory budget, as in `run_scenarios`.
+    max_finished : int
+        The number of finished jobs to keep in memory.
+    """
+
+    def __init__(
+        self,
+        results_dir: str,
+        n_workers: int = 2,
+        corpus_path: str = DATA_PATH,
+        max_memory_mb: Optional[int] = None,
+        max_finished: int = 1000,
+    ):
+        self.results_dir = results_dir
+        self.n_workers = n_workers
+        self.corpus_path = corpus_path
+        self.max_memory_mb = max_memory_mb
+        self.max_finished = max_finished
+        self.jobs: Dict[str, Job] = {}
+        self._corpus = ""
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._manager: Optional[SyncManager] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def __aenter__(self) -> "JobQueue":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.stop()
+
+    async def start(self) -> None:
+        os.makedirs(self.results_dir, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        self._corpus = await loop.run_in_executor(None, corpus_fingerprint, self.corpus_path)
+
+        context = multiprocessing.get_context("spawn")
+        self._manager = context.Manager()
+        self._executor = ProcessPoolExecutor(max_workers=self.n_workers, mp_context=context)
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.n_workers)]
+
+    async def stop(self) -> None:
+        """
+        Cancel all unfinished jobs and shut the workers down.
+        """
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+        # Jobs that were still queued won't finish on their own
+        for job in list(self.jobs.values()):
+            if job.state in (QUEUED, RUNNING):
+                self._finish(job, CANCELLED, exception=JobCancelled(job.job_id))
+
+        # Running jobs stop at their next progress report
+        loop = asyncio.get_running_loop()
+        if self._executor is not None:
+            await loop.run_in_executor(None, self._executor.shutdown)
+        if self._manager is not None:
+            await loop.run_in_executor(None, self._manager.shutdown)
+
+    def submit(self, scenario: Scenario) -> str:
+        """
+        Submit a scenario, returning its job id.
+
+        Parameters
+        ----------
+        scenario : Scenario
+            A scenario dict, as taken by `run_scenarios`.
+
+        Returns
+        -------
+        str
+            The job id. If an identical scenario is already queued or running, and hasn't been
+            cancelled, this is its id and no new job is started.
+        """
+
+        if self._queue is None or self._manager is None:
+            raise RuntimeError("The job queue has not been started.")
+
+        job_id = job_id_from_scenario(scenario, self._corpus, self.max_memory_mb)
+        job = self.jobs.get(job_id)
+        if job is not None and job.state in (QUEUED, RUNNING) and not job.cancelled.is_set():
+            return job_id
+
+        # Resubmitted jobs move to the end, so that the oldest finished jobs are dropped first
+        job = Job(job_id, scenario, asyncio.get_running_loop().create_future(), self._manager)
+        self.jobs.pop(job_id, None)
+        self.jobs[job_id] = job
+        self._queue.put_nowait(job)
+        return job_id
+
+    def status(self, job_id: str) -> Dict:
+        """
+        Report a job's state, and its current stage and progress within that stage.
+
+        Jobs no longer kept in memory are reported as done if their result is on disk.
+        """
+
+        job = self.jobs.get(job_id)
+        if job is None:
+            if load_result(self.results_dir, job_id) is None:
+                raise KeyError(job_id)
+            return {"job_id": job_id, "state": DONE, "stage": None, "done": 0, "total": 0}
+
+        if job.state == RUNNING:
+            job.update()
+        return {
+            "job_id": job_id,
+            "state": job.state,
+            "stage": job.stage,
+            "done": job.done,
+            "total": job.total,
+        }
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job. Queued jobs won't start; running jobs stop at their next progress report,
+        and their output is discarded if they finish first.
+
+        Returns
+        -------
+        bool
+            Whether the job was still queued or running.
+        """
+
+        job = self.jobs.get(job_id)
+        if job is None or job.state not in (QUEUED, RUNNING):
+            return False
+
+        job.cancelled.set()
+        if job.state == QUEUED:
+            self._finish(job, CANCELLED, exception=JobCancelled(job_id))
+        return True
+
+    async def result(self, job_id: str) -> List[str]:
+        """
+        Wait for a job to finish and return its output lines.
+
+        Raises JobCancelled if the job was cancelled, or the job's own exception if it failed.
+        Jobs no longer kept in memory are read back from disk.
+        """
+
+        job = self.jobs.get(job_id)
+        if job is None:
+            result = load_result(self.results_dir, job_id)
+            if result is None:
+                raise KeyError(job_id)
+            return result["output"]
+        return await asyncio.shield(job.future)
+
+    def _finish(
+        self,
+        job: Job,
+        state: str,
+        output: Optional[List[str]] = None,
+        exception: Optional[BaseException] = None,
+    ) -> None:
+        if job.state == RUNNING:
+            job.update()
+        job.state = state
+
+        # Drop the oldest finished jobs beyond the limit; their results stay on disk
+        finished = [
+            job_id for job_id, job_ in self.jobs.items() if job_.state in (DONE, FAILED, CANCELLED)
+        ]
+        for job_id in finished[: max(len(finished) - self.max_finished, 0)]:
+            del self.jobs[job_id]
+
+        if job.future.done():
+            return
+        if exception is not None:
+            job.future.set_exception(exception)
+            # Don't warn about exceptions that nobody waits for
+            job.future.exception()
+        else:
+            job.future.set_result(output)
+
+    def _save(self, job: Job, output: List[str]) -> None:
+        """
+        Persist a job's output, writing to a temporary file first so readers never see half.
+        """
+        path = os.path.join(self.results_dir, f"{job.job_id}.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({"job_id": job.job_id, "scenario": job.scenario, "output": output}, f)
+        os.replace(f"{path}.tmp", path)
+
+    async def _work(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+
+        while True:
+            job = await self._queue.get()
+            try:
+                # Skip jobs cancelled while they were queued
+                if job.state != QUEUED:
+                    continue
+
+                job.state = RUNNING
+                try:
+                    output = await loop.run_in_executor(
+                        self._executor,
+                        _run_job,
+                        job.job_id,
+                        job.scenario,
+                        self.corpus_path,
+                        self.max_memory_mb,
+                        job.progress,
+                        job.cancelled,
+                    )
+
+                    # A job cancelled after its last progress report still finishes
+                    if job.cancelled.is_set():
+                        raise JobCancelled(job.job_id)
+                    self._save(job, output)
+                except JobCancelled as e:
+                    self._finish(job, CANCELLED, exception=e)
+                except asyncio.CancelledError:
+                    self._finish(job, CANCELLED, exception=JobCancelled(job.job_id))
+                    raise
+                except Exception as e:
+                    self._finish(job, FAILED, exception=e)
+                else:
+                    self._finish(job, DONE, output=output)
+            finally:
+                self._queue.task_done()
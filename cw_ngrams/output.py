@@ -1,7 +1,14 @@
-from typing import Dict, List
+from typing import Dict, List, Mapping, Optional
 
+import numpy as np
 
-def make_output(examples: Dict[str, List[str]], sort_length: bool) -> List[str]:
+
+def make_output(
+    examples: Dict[str, List[str]],
+    sort_length: bool,
+    word_difficulties: Optional[Mapping[str, float]] = None,
+    affix_difficulties: Optional[Mapping[str, float]] = None,
+) -> List[str]:
     """
     Make the output user-friendly, and sort if requested.
 
@@ -10,9 +17,12 @@ def make_output(examples: Dict[str, List[str]], sort_length: bool) -> List[str]:
     examples : Dict[str, List[str]]
         A dict mapping affixes to a list of examples that match them.
     sort_length : bool
-        Whether to sort the output by length.
-    shuffle : bool
-        Wheter the randomly shuffle the output
+        Whether to sort the output by length. This can't be combined with difficulties.
+    word_difficulties : Optional[Mapping[str, float]]
+        If given, the difficulty of each example word; examples are ordered from easiest to
+        hardest.
+    affix_difficulties : Optional[Mapping[str, float]]
+        If given, the difficulty of each affix; affixes are ordered from easiest to hardest.
 
     Returns
     -------
@@ -20,13 +30,28 @@ def make_output(examples: Dict[str, List[str]], sort_length: bool) -> List[str]:
         A list of affixes and examples.
     """
 
+    if sort_length and (word_difficulties is not None or affix_difficulties is not None):
+        raise ValueError("Cannot sort both by length and by difficulty.")
+
+    # Order affixes from easiest to hardest
+    affixes = list(examples)
+    if affix_difficulties is not None:
+        scores = np.array([affix_difficulties[affix] for affix in affixes])
+        affixes = [affixes[i] for i in np.argsort(scores, kind="stable")]
+
     output = []
-    for affix, affix_examples in examples.items():
+    for affix in affixes:
+        affix_examples = examples[affix]
 
         # Sort examples by length
         if sort_length:
             affix_examples = sorted(affix_examples, key=lambda x: len(x))
 
+        # Order examples from easiest to hardest
+        if word_difficulties is not None:
+            scores = np.array([word_difficulties[word] for word in affix_examples])
+            affix_examples = [affix_examples[i] for i in np.argsort(scores, kind="stable")]
+
         # Construct output lines
         output.append(f"{affix.upper()} - {', '.join(affix_examples).upper()}")
 
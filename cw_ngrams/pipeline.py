@@ -0,0 +1,249 @@
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .data import (
+    DATA_PATH,
+    Affix,
+    Progress,
+    construct_affixes,
+    find_examples,
+    load_words_and_freqs,
+    merge_affixes,
+    weight_affixes,
+)
+from .difficulty import difficulty, load_difficulties
+from .external import find_examples_streaming, top_affixes
+from .output import make_output
+from .shared import SharedCorpus
+
+Scenario = Dict
+
+DEFAULT_SCENARIO: Scenario = {
+    "ngram_length": 3,
+    "n_affixes": 10,
+    "n_examples": 5,
+    "sort": False,
+    "shuffle": False,
+    "prefixes": False,
+    "suffixes": False,
+    "similar": False,
+    "dissimilar": False,
+    "weighted": 0,
+    "min_word_length": None,
+    "max_word_length": None,
+    "difficulty": False,
+}
+
+# Keys that label a scenario, for instance in `generate_all_ngram_files.py`, without changing it
+SCENARIO_METADATA = ("name", "section")
+
+
+def _word_indices(words: Sequence[str], wanted: Sequence[str]) -> np.ndarray:
+    """
+    The index of the first occurrence of each wanted word, found in a single pass over the words.
+    """
+    wanted_ = set(wanted)
+    first: Dict[str, int] = {}
+    for i, word in enumerate(words):
+        if word in wanted_ and word not in first:
+            first[word] = i
+    return np.array([first[word] for word in wanted], dtype=np.int64)
+
+
+def run_scenarios(
+    scenarios: List[Scenario],
+    corpus_path: str = DATA_PATH,
+    progress: Optional[Progress] = None,
+    corpus: Optional[SharedCorpus] = None,
+    max_memory_mb: Optional[int] = None,
+) -> List[List[str]]:
+    """
+    Run many scenarios, computing each shared intermediate result only once.
+
+    The pipeline is a chain of intermediate results : the corpus, the prefix and suffix tables
+    for each n-gram length, the merged and weighted affix lists, and the examples found for
+    them. Scenarios that only differ further down the chain (for instance, by sorting) share
+    everything computed upstream. Note that scenarios that shuffle with the same n-gram length
+    and affix type also share the same random sample of affixes.
+
+    Parameters
+    ----------
+    scenarios : List[Scenario]
+        Scenario dicts, using the same keys as `generate_all_ngram_files.py`. Missing keys take
+        their values from `DEFAULT_SCENARIO`. Keys in `SCENARIO_METADATA` are ignored, and any
+        other key raises a ValueError, as does keeping only prefixes and only suffixes, or sorting
+        both by length and by difficulty, at once.
+    corpus_path : str
+        The path to the data file.
+    progress : Optional[Progress]
+        If given, called as each stage progresses : "corpus" once the words are loaded,
+        "affixes" once an n-gram length's affix tables are built, "scenarios" after each
+        scenario, and "examples" and "filter" from within `find_examples`.
+    corpus : Optional[SharedCorpus]
+        If given, read words, affix tables and difficulties from this shared corpus instead of
+        loading them; `corpus_path` is then ignored.
+    max_memory_mb : Optional[int]
+        If given, stream the corpus from `corpus_path` within this memory budget rather than
+        loading it, as with `top_affixes` and `find_examples_streaming`. Affix lists are then
+        truncated to what fits in the budget, and scenarios can't be ordered by difficulty.
+
+    Returns
+    -------
+    List[List[str]]
+        The output lines for each scenario, in the same order as the scenarios.
+    """
+
+    # Check every scenario before any work is done, so that a misspelled key isn't ignored
+    for scenario_ in scenarios:
+        unknown_keys = set(scenario_) - set(DEFAULT_SCENARIO) - set(SCENARIO_METADATA)
+        if unknown_keys:
+            raise ValueError(f"Unknown scenario keys : {', '.join(sorted(unknown_keys))}.")
+        if scenario_.get("prefixes") and scenario_.get("suffixes"):
+            raise ValueError("Cannot keep both only prefixes and only suffixes.")
+        if scenario_.get("sort") and scenario_.get("difficulty"):
+            raise ValueError("Cannot sort both by length and by difficulty.")
+        if max_memory_mb is not None and scenario_.get("difficulty"):
+            raise ValueError("Cannot order by difficulty within a memory budget.")
+    if max_memory_mb is not None and corpus is not None:
+        raise ValueError("Cannot stream a shared corpus within a memory budget.")
+
+    # Load words and their frequencies from the data file once for all scenarios, unless we're
+    # streaming it from disk
+    words: Sequence[str] = []
+    freqs: Iterable[int] = []
+    affix_tables: Dict[int, Tuple[Sequence[Affix], Sequence[Affix]]] = {}
+    if corpus is not None:
+        words, freqs = corpus.words, corpus.freqs
+        affix_tables = {n: corpus.affixes(n) for n in corpus.ngram_lengths}
+    elif max_memory_mb is None:
+        words, freqs = load_words_and_freqs(corpus_path)
+    if progress is not None:
+        progress("corpus", 1, 1)
+
+    # Shared corpora search their arrays in place, rather than word by word
+    search_examples: Callable[..., Dict[str, List[str]]]
+    if max_memory_mb is not None:
+        search_examples = partial(find_examples_streaming, corpus_path)
+    elif corpus is None:
+        search_examples = partial(find_examples, words)
+    else:
+        search_examples = corpus.find_examples
+
+    word_scores: Optional[np.ndarray] = None
+    affix_difficulties: Dict[Tuple, Dict[str, float]] = {}
+    merged_affixes: Dict[Tuple, List[Affix]] = {}
+    weighted_affixes: Dict[Tuple, List[Affix]] = {}
+    all_examples: Dict[Tuple, Dict[str, List[str]]] = {}
+
+    outputs = []
+    for scenario_ in scenarios:
+        scenario = {**DEFAULT_SCENARIO, **scenario_}
+        ngram_length: int = scenario["ngram_length"]
+        only_prefixes: bool = scenario["prefixes"]
+        only_suffixes: bool = scenario["suffixes"]
+        min_example_length: Optional[int] = scenario["min_word_length"]
+        max_example_length: Optional[int] = scenario["max_word_length"]
+
+        merge_key = (ngram_length, only_prefixes, only_suffixes, scenario["shuffle"])
+        weight_key = merge_key + (scenario["weighted"],)
+
+        if max_memory_mb is None:
+
+            # Construct prefix and suffix lists for this n-gram length
+            if ngram_length not in affix_tables:
+                affix_tables[ngram_length] = construct_affixes(words, freqs, ngram_length)
+                if progress is not None:
+                    progress("affixes", 1, 1)
+            prefixes, suffixes = affix_tables[ngram_length]
+
+            # Combine prefix and suffix lists, or keep only the desired affix type
+            if merge_key not in merged_affixes:
+                merged_affixes[merge_key] = merge_affixes(
+                    prefixes, suffixes, only_prefixes, only_suffixes, scenario["shuffle"]
+                )
+
+        # Out of core, shuffled affixes are sampled once per affix type and weighted below, as
+        # in memory. Other affixes are weighted as they stream from disk, so that the affixes
+        # kept within the budget are the top weighted ones.
+        elif scenario["shuffle"] and merge_key not in merged_affixes:
+            merged_affixes[merge_key] = top_affixes(
+                corpus_path, ngram_length, only_prefixes, only_suffixes, True, 0, max_memory_mb
+            )
+        elif not scenario["shuffle"] and weight_key not in weighted_affixes:
+            weighted_affixes[weight_key] = top_affixes(
+                corpus_path,
+                ngram_length,
+                only_prefixes,
+                only_suffixes,
+                False,
+                scenario["weighted"],
+                max_memory_mb,
+            )
+
+        # Order affixes by CW weight if needed; weighting happens in place, so work on a copy
+        if weight_key not in weighted_affixes:
+            weighted_affixes[weight_key] = weight_affixes(
+                list(merged_affixes[merge_key]), scenario["weighted"]
+            )
+
+        # Find examples of words that match the affixes, potentially filtered by criteria
+        examples_key = weight_key + (
+            scenario["n_affixes"],
+            scenario["n_examples"],
+            min_example_length,
+            max_example_length,
+            scenario["similar"],
+            scenario["dissimilar"],
+        )
+        if examples_key not in all_examples:
+            all_examples[examples_key] = search_examples(
+                weighted_affixes[weight_key],
+                scenario["n_affixes"],
+                scenario["n_examples"],
+                only_prefixes,
+                only_suffixes,
+                min_example_length,
+                max_example_length,
+                scenario["similar"],
+                scenario["dissimilar"],
+                progress,
+            )
+
+        # Score words and affixes by how hard they are to copy, if we're ordering by difficulty;
+        # words are looked up by index, and only for the examples being output
+        word_difficulties: Optional[Dict[str, float]] = None
+        if scenario["difficulty"]:
+            if word_scores is None:
+                if corpus is None:
+                    word_scores = load_difficulties(corpus_path, list(words), list(freqs))
+                else:
+                    word_scores = corpus.difficulties
+            example_words = sorted(
+                {word for examples in all_examples[examples_key].values() for word in examples}
+            )
+            if corpus is None:
+                indices = _word_indices(words, example_words)
+            else:
+                indices = corpus.word_indices(example_words)
+            word_difficulties = dict(zip(example_words, word_scores[indices].tolist()))
+
+            if merge_key not in affix_difficulties:
+                merged = merged_affixes[merge_key]
+                scores = difficulty([affix for affix, _ in merged], [freq for _, freq in merged])
+                affix_difficulties[merge_key] = dict(zip([affix for affix, _ in merged], scores))
+
+        # Make the output friendly, and sort if requested
+        outputs.append(
+            make_output(
+                all_examples[examples_key],
+                scenario["sort"],
+                word_difficulties,
+                affix_difficulties.get(merge_key) if scenario["difficulty"] else None,
+            )
+        )
+        if progress is not None:
+            progress("scenarios", len(outputs), len(scenarios))
+
+    return outputs
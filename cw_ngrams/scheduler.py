@@ -0,0 +1,197 @@
+import sqlite3
+import time
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Leitner boxes : an item in box b is due again INTERVAL * 2 ** b seconds after its last review
+INTERVAL = 24 * 60 * 60
+MAX_BOX = 6
+
+Review = Tuple[str, str, bool]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    rank INTEGER PRIMARY KEY,
+    item TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS cards (
+    user_id TEXT NOT NULL,
+    item TEXT NOT NULL,
+    box INTEGER NOT NULL,
+    due REAL NOT NULL,
+    PRIMARY KEY (user_id, item)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cards_due ON cards (user_id, due);
+CREATE TEMP TABLE IF NOT EXISTS active_items (item TEXT PRIMARY KEY);
+CREATE TEMP TABLE IF NOT EXISTS session_users (user_id TEXT PRIMARY KEY);
+"""
+
+
+class Scheduler:
+    """
+    Schedule affix drills for many users with Leitner spaced repetition.
+
+    Each user has a card per affix they have been introduced to. Recalling an affix correctly
+    moves its card up a box, doubling the time until it is due again; failing it sends the card
+    back to the first box. Sessions are made of due cards first, topped up with new affixes in
+    the order they were first given to the scheduler. Only affixes in `examples` are scheduled;
+    cards for other affixes, from earlier runs on the same database, are kept but left alone.
+
+    State lives in a SQLite database. Reviews are written in batches, and the sessions for a
+    whole roster of users are built with a handful of bulk queries.
+
+    Parameters
+    ----------
+    path : str
+        The path to the SQLite database; created if it doesn't exist.
+    examples : Dict[str, List[str]]
+        A dict mapping affixes to their examples, as returned by `find_examples`. Affixes are
+        introduced to users in the order of this dict.
+    """
+
+    def __init__(self, path: str, examples: Dict[str, List[str]]):
+
+        self.examples = examples
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+        # Register any new affixes after the existing ones, so ranks stay stable across runs
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO items (item) VALUES (?)",
+                [(affix,) for affix in examples],
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO active_items (item) VALUES (?)",
+                [(affix,) for affix in examples],
+            )
+        self.items = [
+            item
+            for (item,) in self.connection.execute(
+                "SELECT i.item FROM items i JOIN active_items a ON i.item = a.item ORDER BY i.rank"
+            )
+        ]
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def record(self, reviews: Iterable[Review], now: Optional[float] = None) -> None:
+        """
+        Record a batch of reviews in a single transaction.
+
+        Reviews of affixes that were never scheduled for that user are ignored.
+
+        Parameters
+        ----------
+        reviews : Iterable[Review]
+            Tuples of user id, affix, and whether the user recalled the affix correctly.
+        now : Optional[float]
+            The time of the reviews as a UNIX timestamp; defaults to the current time.
+        """
+
+        now = time.time() if now is None else now
+
+        with self.connection:
+            self.connection.executemany(
+                """
+                UPDATE cards
+                SET box = CASE WHEN :correct THEN MIN(box + 1, :max_box) ELSE 0 END,
+                    due = :now + :interval * (
+                        1 << CASE WHEN :correct THEN MIN(box + 1, :max_box) ELSE 0 END
+                    )
+                WHERE user_id = :user_id AND item = :item
+                """,
+                (
+                    {
+                        "user_id": user_id,
+                        "item": item,
+                        "correct": bool(correct),
+                        "max_box": MAX_BOX,
+                        "now": now,
+                        "interval": INTERVAL,
+                    }
+                    for user_id, item, correct in reviews
+                ),
+            )
+
+    def next_sessions(
+        self, user_ids: List[str], n_affixes: int, now: Optional[float] = None
+    ) -> Dict[str, Dict[str, List[str]]]:
+        """
+        Build the next session for many users at once.
+
+        Parameters
+        ----------
+        user_ids : List[str]
+            The users to build sessions for. Unknown users are created.
+        n_affixes : int
+            The maximum number of affixes in each session.
+        now : Optional[float]
+            The time of the sessions as a UNIX timestamp; defaults to the current time.
+
+        Returns
+        -------
+        Dict[str, Dict[str, List[str]]]
+            A dict mapping user ids to their session : a dict mapping affixes to their examples,
+            most overdue first, which can be passed on to `make_output`.
+        """
+
+        now = time.time() if now is None else now
+
+        with self.connection:
+            self.connection.execute("DELETE FROM session_users")
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO session_users (user_id) VALUES (?)",
+                [(u,) for u in user_ids],
+            )
+
+            # The most overdue cards for every user, in one query
+            sessions: Dict[str, List[str]] = {user_id: [] for user_id in user_ids}
+            due_cards = self.connection.execute(
+                """
+                SELECT user_id, item FROM (
+                    SELECT c.user_id, c.item, ROW_NUMBER() OVER (
+                        PARTITION BY c.user_id ORDER BY c.due, c.box
+                    ) AS position
+                    FROM cards c
+                    JOIN session_users s ON c.user_id = s.user_id
+                    JOIN active_items a ON c.item = a.item
+                    WHERE c.due <= ?
+                )
+                WHERE position <= ?
+                ORDER BY user_id, position
+                """,
+                (now, n_affixes),
+            )
+            for user_id, item in due_cards:
+                sessions[user_id].append(item)
+
+            # Top up sessions with the first affixes each user has no card for yet
+            introduced: Dict[str, Set[str]] = {user_id: set() for user_id in user_ids}
+            for user_id, item in self.connection.execute(
+                "SELECT c.user_id, c.item FROM cards c "
+                "JOIN session_users s ON c.user_id = s.user_id "
+                "JOIN active_items a ON c.item = a.item"
+            ):
+                introduced[user_id].add(item)
+
+            new_cards = []
+            for user_id, items in sessions.items():
+                n_new = n_affixes - len(items)
+                if n_new <= 0:
+                    continue
+                new_items = list(
+                    islice((item for item in self.items if item not in introduced[user_id]), n_new)
+                )
+                items.extend(new_items)
+                new_cards += [(user_id, item, 0, now) for item in new_items]
+
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO cards (user_id, item, box, due) VALUES (?, ?, ?, ?)",
+                new_cards,
+            )
+
+        return {
+            user_id: {item: self.examples[item] for item in items}
+            for user_id, items in sessions.items()
+        }
@@ -0,0 +1,375 @@
+import json
+import sys
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, overload
+
+import numpy as np
+
+from .data import Affix, Progress, _filter_examples, construct_affixes
+from .difficulty import difficulty
+
+# Arrays are laid out after the header, each starting on an 8-byte boundary
+ALIGNMENT = 8
+HEADER_LENGTH_BYTES = 8
+
+
+class SharedWords(Sequence[str]):
+    """
+    A read-only sequence of words over a fixed-width bytes array, decoded on access.
+    """
+
+    def __init__(self, array: np.ndarray):
+        self.array = array
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    @overload
+    def __getitem__(self, idx: int) -> str:
+        ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> List[str]:
+        ...
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [word.decode() for word in self.array[idx]]
+        return self.array[idx].decode()
+
+    def __iter__(self) -> Iterator[str]:
+        for word in self.array:
+            yield word.decode()
+
+
+class SharedAffixes(Sequence[Affix]):
+    """
+    A read-only sequence of affixes and their frequencies over shared arrays.
+    """
+
+    def __init__(self, affixes: np.ndarray, freqs: np.ndarray):
+        self.affixes = affixes
+        self.freqs = freqs
+
+    def __len__(self) -> int:
+        return len(self.affixes)
+
+    @overload
+    def __getitem__(self, idx: int) -> Affix:
+        ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> List[Affix]:
+        ...
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [
+                (affix.decode(), int(freq))
+                for affix, freq in zip(self.affixes[idx], self.freqs[idx])
+            ]
+        return self.affixes[idx].decode(), int(self.freqs[idx])
+
+    def __iter__(self) -> Iterator[Affix]:
+        for affix, freq in zip(self.affixes, self.freqs):
+            yield affix.decode(), int(freq)
+
+
+class SharedCorpus:
+    """
+    A corpus and its affix tables, published once in shared memory for many processes.
+
+    The parent process builds the corpus and its affix tables and publishes them as flat arrays
+    in a single shared memory block. Worker processes attach to the block by name, and read
+    the arrays in place : attaching doesn't copy anything, so it is near-instant, and the
+    memory used by each worker doesn't grow with the size of the corpus.
+
+    Use `publish` in the parent and `attach` in the workers; don't create one directly.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+
+        raw = np.ndarray(shm.size, dtype=np.uint8, buffer=shm.buf)
+        header_length = int.from_bytes(raw[:HEADER_LENGTH_BYTES].tobytes(), "little")
+        header_end = HEADER_LENGTH_BYTES + header_length
+        header = json.loads(raw[HEADER_LENGTH_BYTES:header_end].tobytes())
+        del raw
+
+        self.arrays: Dict[str, np.ndarray] = {
+            key: np.ndarray(
+                tuple(spec["shape"]), dtype=spec["dtype"], buffer=shm.buf, offset=spec["offset"]
+            )
+            for key, spec in header.items()
+        }
+        for array in self.arrays.values():
+            array.flags.writeable = False
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def words(self) -> SharedWords:
+        return SharedWords(self.arrays["words"])
+
+    @property
+    def freqs(self) -> np.ndarray:
+        return self.arrays["freqs"]
+
+    @property
+    def difficulties(self) -> np.ndarray:
+        return self.arrays["difficulties"]
+
+    def word_indices(self, words: Sequence[str]) -> np.ndarray:
+        """
+        The index of each word in the corpus, found by binary search without decoding the corpus.
+
+        Words that appear more than once map to their first occurrence. Raises a KeyError for
+        words that aren't in the corpus.
+        """
+
+        if len(words) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        array, order = self.arrays["words"], self.arrays["word_order"]
+        encoded = np.array([word.encode() for word in words], dtype=bytes)
+        positions = np.minimum(np.searchsorted(array, encoded, sorter=order), len(array) - 1)
+        indices = order[positions]
+        missing = array[indices] != encoded
+        if missing.any():
+            raise KeyError(words[int(np.argmax(missing))])
+        return indices
+
+    @property
+    def ngram_lengths(self) -> List[int]:
+        return sorted(int(key.split("_")[1]) for key in self.arrays if key.startswith("prefixes_"))
+
+    def affixes(self, ngram_length: int) -> Tuple[SharedAffixes, SharedAffixes]:
+        """
+        The prefixes and suffixes for an n-gram length, as returned by `construct_affixes`.
+        """
+        return (
+            SharedAffixes(
+                self.arrays[f"prefixes_{ngram_length}"],
+                self.arrays[f"prefix_freqs_{ngram_length}"],
+            ),
+            SharedAffixes(
+                self.arrays[f"suffixes_{ngram_length}"],
+                self.arrays[f"suffix_freqs_{ngram_length}"],
+            ),
+        )
+
+    @classmethod
+    def publish(
+        cls,
+        words: List[str],
+        freqs: List[int],
+        ngram_lengths: Iterable[int],
+        name: Optional[str] = None,
+    ) -> "SharedCorpus":
+        """
+        Build the affix tables and difficulties for a corpus, and publish them in shared memory.
+
+        Parameters
+        ----------
+        words : List[str]
+            A list of words.
+        freqs : List[int]
+            A list of word frequencies.
+        ngram_lengths : Iterable[int]
+            The n-gram lengths to build affix tables for.
+        name : Optional[str]
+            The name of the shared memory block; chosen at random if not given.
+
+        Returns
+        -------
+        SharedCorpus
+            The published corpus. Call `unlink` once all workers are done with it.
+        """
+
+        arrays = {
+            "words": np.array([word.encode() for word in words], dtype=bytes),
+            "lengths": np.array([len(word) for word in words], dtype=np.int64),
+            "freqs": np.array(freqs, dtype=np.int64),
+            "difficulties": difficulty(words, freqs),
+        }
+        arrays["word_order"] = np.argsort(arrays["words"], kind="stable")
+        for ngram_length in ngram_lengths:
+            prefixes, suffixes = construct_affixes(words, freqs, ngram_length)
+            for affix_type, affixes in [("prefix", prefixes), ("suffix", suffixes)]:
+                arrays[f"{affix_type}es_{ngram_length}"] = np.array(
+                    [affix.encode() for affix, _ in affixes], dtype=bytes
+                )
+                arrays[f"{affix_type}_freqs_{ngram_length}"] = np.array(
+                    [freq for _, freq in affixes], dtype=np.int64
+                )
+
+        # Lay out arrays one after the other, after a header describing where they are
+        header: Dict[str, Dict] = {}
+        offset = 0
+        for key, array in arrays.items():
+            header[key] = {"offset": offset, "dtype": array.dtype.str, "shape": array.shape}
+            offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+        # Arrays start after the header, whose length depends on their offsets; iterate until
+        # the header fits
+        start = 0
+        while True:
+            header_bytes = json.dumps(
+                {key: {**spec, "offset": spec["offset"] + start} for key, spec in header.items()}
+            ).encode()
+            header_end = -(-(HEADER_LENGTH_BYTES + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+            if header_end <= start:
+                break
+            start = header_end
+        for spec in header.values():
+            spec["offset"] += start
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=max(1, start + offset))
+        header_block = len(header_bytes).to_bytes(HEADER_LENGTH_BYTES, "little") + header_bytes
+        header_view = np.ndarray(len(header_block), dtype=np.uint8, buffer=shm.buf)
+        header_view[...] = np.frombuffer(header_block, dtype=np.uint8)
+        del header_view
+        for key, array in arrays.items():
+            spec = header[key]
+            view = np.ndarray(
+                array.shape, dtype=array.dtype, buffer=shm.buf, offset=spec["offset"]
+            )
+            view[...] = array
+            del view
+
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedCorpus":
+        """
+        Attach to a corpus published by another process, without copying it.
+        """
+
+        # The block belongs to the publishing process; before Python 3.13, attaching registers it
+        # with this process's resource tracker, which would unlink it when this process exits
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore
+        return cls(shm, owner=False)
+
+    def close(self) -> None:
+        """
+        Detach from the shared memory. Sequences and arrays taken from this corpus become invalid.
+        """
+        self.arrays = {}
+        self.shm.close()
+
+    def unlink(self) -> None:
+        """
+        Detach from and free the shared memory; only the publishing process should call this.
+        """
+        self.close()
+        if self.owner:
+            # Workers sharing our resource tracker may have unregistered the block in `attach`;
+            # registering is idempotent, and lets unlinking unregister it without complaint
+            if sys.version_info < (3, 13):
+                resource_tracker.register(self.shm._name, "shared_memory")  # type: ignore
+            self.shm.unlink()
+
+    def __enter__(self) -> "SharedCorpus":
+        return self
+
+    def __exit__(self, *args) -> None:
+        if self.owner:
+            self.unlink()
+        else:
+            self.close()
+
+    def find_examples(
+        self,
+        affixes: Sequence[Affix],
+        n_affixes: int,
+        n_examples: int,
+        only_prefixes: bool,
+        only_suffixes: bool,
+        min_example_length: Optional[int],
+        max_example_length: Optional[int],
+        similar: bool,
+        dissimilar: bool,
+        progress: Optional[Progress] = None,
+    ) -> Dict[str, List[str]]:
+        """
+        Find a list of examples that match the affixes, searching the shared arrays in place.
+
+        This returns the same examples as `find_examples` on the same words, but matches each
+        affix against all words at once rather than decoding words one at a time.
+
+        Parameters
+        ----------
+        affixes : Sequence[Affix]
+            The affixes and their frequencies.
+        n_affixes : int
+            The number of affixes to find examples for.
+        n_examples : int
+            The number of examples to find for each affix.
+        only_prefixes : bool
+            Whether to only search for words that match prefixes.
+        only_suffixes : bool
+            Whether to only search for words that match suffixes.
+        progress : Optional[Progress]
+            If given, called with "examples" after each affix is searched, and with "filter"
+            while filtering examples.
+
+        Returns
+        -------
+        Dict[str, List[str]]
+            A dict mapping affixes to a list of examples that match them.
+        """
+
+        words = self.arrays["words"]
+        lengths = self.arrays["lengths"]
+
+        # Are we filtering any examples post-match ? If so, we need to find many more examples
+        filters = similar or dissimilar
+        target_n_examples: int = n_examples * 3 if filters else n_examples
+
+        # Words that are too long or too short can be thrown out once, for all affixes
+        length_mask = np.ones(len(words), dtype=bool)
+        if min_example_length:
+            length_mask &= lengths >= min_example_length
+        if max_example_length:
+            length_mask &= lengths <= max_example_length
+
+        examples: Dict[str, List[str]] = {}
+        if target_n_examples == 0:
+            return examples
+
+        for affix, _ in affixes:
+
+            # Only words strictly longer than the affix can match it
+            affix_bytes = affix.encode()
+            mask = length_mask & (lengths > len(affix))
+            if only_prefixes:
+                mask &= np.char.startswith(words, affix_bytes)
+            elif only_suffixes:
+                mask &= np.char.endswith(words, affix_bytes)
+            else:
+                mask &= np.char.startswith(words, affix_bytes) | np.char.endswith(
+                    words, affix_bytes
+                )
+
+            # Keep only affixes with sufficient examples
+            idx = np.flatnonzero(mask)[:target_n_examples]
+            if len(idx) == target_n_examples:
+                examples[affix] = [words[i].decode() for i in idx]
+
+            if progress is not None:
+                progress("examples", len(examples), n_affixes)
+
+            if len(examples) == n_affixes:
+                break
+
+        # Filter out examples that are too similar or too dissimilar if requested
+        examples = _filter_examples(examples, n_examples, similar, dissimilar, progress)
+
+        return examples
@@ -1,7 +1,8 @@
 from pathlib import Path
-from subprocess import Popen
 from typing import Dict, List
 
+from cw_ngrams import run_scenarios
+
 PREAMBLES = {
     "exercises": "Head-copy exercise :",
     "generic": "Generic results :",
@@ -20,12 +21,16 @@ BASE_SCENARIO = {
     "similar": False,
     "dissimilar": False,
     "weighted": 0,
+    "difficulty": False,
     "section": "generic",
 }
 
 RANDOM_SCENARIO = BASE_SCENARIO.copy()
 RANDOM_SCENARIO.update({"name": "random", "sort": True, "shuffle": True})
 
+GRADED_SCENARIO = BASE_SCENARIO.copy()
+GRADED_SCENARIO.update({"difficulty": True})
+
 
 def generate_scenarios() -> List[Dict]:
 
@@ -47,7 +52,7 @@ def generate_scenarios() -> List[Dict]:
                 scenarios.append(scenario)
 
     # Create various scenarios for more generic results
-    for scenario_type in [BASE_SCENARIO, RANDOM_SCENARIO]:
+    for scenario_type in [BASE_SCENARIO, RANDOM_SCENARIO, GRADED_SCENARIO]:
         for ngram_length in range(2, 5):
             for prefixes in [True, False]:
                 for suffixes in [True, False]:
@@ -69,56 +74,6 @@ def generate_scenarios() -> List[Dict]:
     return scenarios
 
 
-def generate_command_from_scenario(scenario: Dict) -> List[str]:
-
-    ngram_length = scenario["ngram_length"]
-    n_affixes = scenario["n_affixes"]
-    n_examples = scenario["n_examples"]
-    sort = scenario["sort"]
-    shuffle = scenario["shuffle"]
-    prefixes = scenario["prefixes"]
-    suffixes = scenario["suffixes"]
-    similar = scenario["similar"]
-    dissimilar = scenario["dissimilar"]
-    weighted = scenario["weighted"]
-    min_word_length = scenario.get("min_word_length")
-    max_word_length = scenario.get("max_word_length")
-
-    command = [
-        "poetry",
-        "run",
-        "python",
-        "generate_ngrams_from_scenario.py",
-        "--ngram_length",
-        str(ngram_length),
-        "--n_affixes",
-        str(n_affixes),
-        "--n_examples",
-        str(n_examples),
-        "--weighted",
-        str(weighted),
-    ]
-
-    if prefixes:
-        command.append("--prefixes")
-    if suffixes:
-        command.append("--suffixes")
-    if sort:
-        command.append("--sort")
-    if shuffle:
-        command.append("--shuffle")
-    if similar:
-        command.append("--similar")
-    if dissimilar:
-        command.append("--dissimilar")
-    if min_word_length is not None:
-        command += ["--min_example_length", str(min_word_length)]
-    if max_word_length is not None:
-        command += ["--max_example_length", str(max_word_length)]
-
-    return command
-
-
 def generate_filename_from_scenario(scenario: Dict) -> Path:
     name = scenario["name"]
     ngram_length = scenario["ngram_length"]
@@ -140,6 +95,7 @@ def generate_filename_from_scenario(scenario: Dict) -> Path:
         f"{'_weighted' if scenario['weighted'] > 0 else ''}"
         f"_{affix_type}"
         f"{'_sorted' if sort else ''}"
+        f"{'_graded' if scenario.get('difficulty') else ''}"
         f"{'_shuffled' if shuffle else ''}"
         ".txt"
     )
@@ -174,6 +130,8 @@ def generate_link_from_scenario(scenario: Dict, filename: Path) -> str:
 
     if sort:
         link_name += ", sorted"
+    if scenario.get("difficulty"):
+        link_name += ", easiest to hardest"
     if shuffle:
         link_name += ", shuffled"
 
@@ -181,28 +139,30 @@ def generate_link_from_scenario(scenario: Dict, filename: Path) -> str:
     return readme_line
 
 
-def run_command(command: List[str], filename: Path) -> None:
-    print(f"Generating {filename}; calling {' '.join(command)}")
-    process = Popen(command, stdout=open("results" / filename, "w"))
-    process.wait()
+def write_output(output: List[str], filename: Path) -> None:
+    print(f"Writing {filename}")
+    with open("results" / filename, "w") as f:
+        f.writelines(f"{line}\n" for line in output)
 
 
 def main():
 
     readme = "# Results\n\n"
 
-    # Create scenarios and their commands, their results filenames, and a link to those results
+    # Create scenarios, their results filenames, and a link to those results
     scenarios = generate_scenarios()
-    commands = [generate_command_from_scenario(scenario) for scenario in scenarios]
     filenames = [generate_filename_from_scenario(scenario) for scenario in scenarios]
     links = [
         generate_link_from_scenario(scenario, filename)
         for scenario, filename in zip(scenarios, filenames)
     ]
 
-    # Run each scenario, saving output to a file and updating the README
-    for command, filename, link in zip(commands, filenames, links):
-        run_command(command, filename)
+    # Run all scenarios at once so that they share intermediate results
+    outputs = run_scenarios(scenarios)
+
+    # Save each scenario's output to a file and update the README
+    for output, filename, link in zip(outputs, filenames, links):
+        write_output(output, filename)
         readme += link
 
     # Save the README after running all scenarios
@@ -1,14 +1,7 @@
 from typing import Optional
 
-from cw_ngrams import (
-    construct_affixes,
-    find_examples,
-    load_words_and_freqs,
-    make_output,
-    merge_affixes,
-    parse_args,
-    weight_affixes,
-)
+from cw_ngrams import parse_args, run_scenarios
+from cw_ngrams.data import DATA_PATH
 
 
 def main(
@@ -24,37 +17,34 @@ def main(
     similar: bool,
     dissimilar: bool,
     weighted: float,
+    sort_difficulty: bool = False,
+    corpus_path: str = DATA_PATH,
+    max_memory_mb: Optional[int] = None,
 ):
 
-    # Load words and their frequencies from the data file
-    words, freqs = load_words_and_freqs()
-
-    # Construct prefix and suffix lists; aggregate frequencies
-    prefixes, suffixes = construct_affixes(words, freqs, ngram_length)
-
-    # Combine prefix and suffix lists, or keep only the desired affix type
-    affixes = merge_affixes(prefixes, suffixes, only_prefixes, only_suffixes, shuffle)
-
-    # Order affixes by CW weight if needed
-    affixes = weight_affixes(affixes, weighted)
-
-    # Find examples of words that match the affixes, potentially filtered by criteria
-    examples = find_examples(
-        words,
-        affixes,
-        n_affixes,
-        n_examples,
-        only_prefixes,
-        only_suffixes,
-        min_example_length,
-        max_example_length,
-        similar,
-        dissimilar,
+    # Run the pipeline for this single scenario, streaming the corpus if it's too large for memory
+    (output,) = run_scenarios(
+        [
+            {
+                "ngram_length": ngram_length,
+                "n_affixes": n_affixes,
+                "n_examples": n_examples,
+                "sort": sort_length,
+                "shuffle": shuffle,
+                "prefixes": only_prefixes,
+                "suffixes": only_suffixes,
+                "similar": similar,
+                "dissimilar": dissimilar,
+                "weighted": weighted,
+                "min_word_length": min_example_length,
+                "max_word_length": max_example_length,
+                "difficulty": sort_difficulty,
+            }
+        ],
+        corpus_path,
+        max_memory_mb=max_memory_mb,
     )
 
-    # Make the output friendly, and sort if requested
-    output = make_output(examples, sort_length)
-
     for line in output:
         print(line)
 
@@ -75,4 +65,7 @@ if __name__ == "__main__":
         similar=args.similar,
         dissimilar=args.dissimilar,
         weighted=args.weighted,
+        sort_difficulty=args.sort_difficulty,
+        corpus_path=args.corpus_path,
+        max_memory_mb=args.max_memory_mb,
     )
@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+
+from cw_ngrams.difficulty import (
+    CONFUSION,
+    CONFUSION_WEIGHT,
+    DURATION,
+    difficulty,
+    difficulty_path,
+    load_difficulties,
+)
+
+
+def test_characters_outside_the_alphabet_are_hardest():
+    cafe, cafe_accented, its, its_apostrophe = difficulty(["cafe", "café", "its", "it's"], [1] * 4)
+    assert cafe_accented > cafe
+    assert its_apostrophe > its
+
+    # Lengths count characters, not bytes : a single "é" has no gap between characters
+    assert difficulty(["é"], [1])[0] == DURATION.max() + CONFUSION_WEIGHT * CONFUSION.max()
+
+
+def test_cache_follows_corpus_contents(tmp_path):
+    path = str(tmp_path / "words.txt")
+    with open(path, "w") as f:
+        f.write("cafe\t2\nté\t1\n")
+    first = load_difficulties(path, ["cafe", "té"], [2, 1])
+    assert os.path.exists(difficulty_path(path))
+
+    # Same size and modification time, but different contents
+    stat = os.stat(path)
+    with open(path, "w") as f:
+        f.write("cafe\t1\nté\t2\n")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    second = load_difficulties(path, ["cafe", "té"], [1, 2])
+    assert not np.array_equal(first, second)
+    assert np.array_equal(second, difficulty(["cafe", "té"], [1, 2]))
+
+    # Corpora that only differ by extension don't share a cache
+    assert difficulty_path(path) != difficulty_path(str(tmp_path / "words.tsv"))
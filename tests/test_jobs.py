@@ -0,0 +1,63 @@
+import asyncio
+import os
+
+import pytest
+
+from cw_ngrams import JobQueue, load_result, run_scenarios
+from cw_ngrams.jobs import CANCELLED, DONE, RUNNING, JobCancelled, job_id_from_scenario
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "most_common_words.txt")
+
+SCENARIO = {"ngram_length": 3, "n_affixes": 5}
+
+
+async def _submit_cancel_and_resubmit(results_dir: str) -> None:
+    async with JobQueue(results_dir, 1, DATA_PATH) as queue:
+        job_id = queue.submit(SCENARIO)
+        assert queue.submit(dict(SCENARIO)) == job_id
+        first = queue.jobs[job_id]
+        while first.state != RUNNING:
+            await asyncio.sleep(0.01)
+
+        # A cancelled job that is still running must not be handed out again
+        assert queue.cancel(job_id)
+        assert queue.submit(SCENARIO) == job_id
+        assert queue.jobs[job_id] is not first
+
+        # Whether it stops at a progress report or finishes first, its output is discarded
+        with pytest.raises(JobCancelled):
+            await first.future
+        assert first.state == CANCELLED
+
+        (expected,) = run_scenarios([SCENARIO], DATA_PATH)
+        assert await queue.result(job_id) == expected
+        assert queue.status(job_id)["state"] == DONE
+        result = load_result(results_dir, job_id)
+        assert result is not None and result["output"] == expected
+
+
+def test_submit_cancel_and_resubmit(tmp_path):
+    asyncio.run(_submit_cancel_and_resubmit(str(tmp_path / "results")))
+
+
+async def _keep_last_finished(results_dir: str) -> None:
+    async with JobQueue(results_dir, 2, DATA_PATH, max_finished=1) as queue:
+        job_ids = [queue.submit({**SCENARIO, "n_affixes": n_affixes}) for n_affixes in [1, 2]]
+        outputs = [await queue.result(job_id) for job_id in job_ids]
+
+    # Only the last job to finish is kept in memory; the other is read back from disk
+    assert len(queue.jobs) == 1
+    for job_id, output in zip(job_ids, outputs):
+        assert queue.status(job_id)["state"] == DONE
+        assert await queue.result(job_id) == output
+
+
+def test_keep_last_finished(tmp_path):
+    asyncio.run(_keep_last_finished(str(tmp_path / "results")))
+
+
+def test_job_ids_depend_on_corpus_and_memory_budget():
+    job_id = job_id_from_scenario(SCENARIO, "1000-a")
+    assert job_id_from_scenario({**SCENARIO, "name": "other"}, "1000-a") == job_id
+    assert job_id_from_scenario(SCENARIO, "1000-b") != job_id
+    assert job_id_from_scenario(SCENARIO, "1000-a", max_memory_mb=16) != job_id
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from cw_ngrams import run_scenarios
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "most_common_words.txt")
+
+
+@pytest.mark.parametrize(
+    "scenario, message",
+    [
+        ({"min_example_length": 3}, "Unknown scenario keys : min_example_length."),
+        (
+            {"prefixes": True, "suffixes": True},
+            "Cannot keep both only prefixes and only suffixes.",
+        ),
+        ({"sort": True, "difficulty": True}, "Cannot sort both by length and by difficulty."),
+    ],
+)
+def test_rejects_invalid_scenarios(scenario, message):
+    # A valid scenario first, to check that nothing runs before every scenario is checked
+    with pytest.raises(ValueError, match=message):
+        run_scenarios([{"n_affixes": 1}, scenario], "does_not_exist.txt")
+
+
+def test_ignores_metadata():
+    scenario = {"ngram_length": 2, "n_affixes": 3}
+    assert run_scenarios([{**scenario, "name": "short", "section": "generic"}], DATA_PATH) == (
+        run_scenarios([scenario], DATA_PATH)
+    )
+
+
+def test_streams_within_memory_budget():
+    scenarios = [{"ngram_length": 2, "n_affixes": 3}, {"suffixes": True, "similar": True}]
+    assert run_scenarios(scenarios, DATA_PATH, max_memory_mb=4) == (
+        run_scenarios(scenarios, DATA_PATH)
+    )
+    with pytest.raises(ValueError, match="Cannot order by difficulty within a memory budget."):
+        run_scenarios([{"difficulty": True}], DATA_PATH, max_memory_mb=4)
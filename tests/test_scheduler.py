@@ -0,0 +1,52 @@
+from cw_ngrams import Scheduler
+from cw_ngrams.scheduler import INTERVAL, MAX_BOX
+
+
+def test_reopening_with_other_affixes(tmp_path):
+    path = str(tmp_path / "schedule.db")
+    scheduler = Scheduler(path, {"ing": ["being"], "pro": ["program"], "the": ["them"]})
+    scheduler.next_sessions(["u1"], 2, now=0)
+    scheduler.close()
+
+    # u1's due cards and remaining new affix are stale; the new affixes must still come up
+    scheduler = Scheduler(path, {"tion": ["nation"], "ment": ["moment"]})
+    sessions = scheduler.next_sessions(["u1", "u2"], 2, now=10**9)
+    scheduler.close()
+    assert list(sessions["u1"]) == ["tion", "ment"]
+    assert list(sessions["u2"]) == ["tion", "ment"]
+
+    # Affixes dropped in between come back once given again, with their cards intact
+    scheduler = Scheduler(path, {"ing": ["being"], "tion": ["nation"]})
+    sessions = scheduler.next_sessions(["u1", "u2"], 2, now=10**9)
+    scheduler.close()
+    assert list(sessions["u1"]) == ["ing", "tion"]
+    assert list(sessions["u2"]) == ["tion", "ing"]
+
+
+def test_record_moves_cards_between_boxes(tmp_path):
+    scheduler = Scheduler(str(tmp_path / "schedule.db"), {"ing": [], "pro": [], "the": []})
+    cards = lambda: {
+        item: (box, due)
+        for item, box, due in scheduler.connection.execute(
+            "SELECT item, box, due FROM cards WHERE user_id = 'u1'"
+        )
+    }
+    assert list(scheduler.next_sessions(["u1"], 2, now=0)["u1"]) == ["ing", "pro"]
+
+    # A correct review moves a card up a box, doubling its interval; a miss sends it back to
+    # the first box. "the" was never scheduled for u1, so its review is ignored.
+    scheduler.record([("u1", "ing", True), ("u1", "pro", False), ("u1", "the", True)], now=0)
+    assert cards() == {"ing": (1, 2 * INTERVAL), "pro": (0, INTERVAL)}
+
+    # Only the missed card is due after one interval, and a new affix tops up the session;
+    # the card that was recalled is due after two intervals, after the others
+    assert list(scheduler.next_sessions(["u1"], 2, now=INTERVAL)["u1"]) == ["pro", "the"]
+    assert list(scheduler.next_sessions(["u1"], 3, now=2 * INTERVAL)["u1"])[2] == "ing"
+
+    # Boxes stop at MAX_BOX, and a single miss from there goes back to the first box
+    for n_review in range(MAX_BOX + 2):
+        scheduler.record([("u1", "ing", True)], now=n_review)
+    assert cards()["ing"] == (MAX_BOX, MAX_BOX + 1 + INTERVAL * 2**MAX_BOX)
+    scheduler.record([("u1", "ing", False)], now=10**9)
+    assert cards()["ing"] == (0, 10**9 + INTERVAL)
+    scheduler.close()
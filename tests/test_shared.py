@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+
+from cw_ngrams import SharedCorpus, load_words_and_freqs, run_scenarios
+
+# Attach to a shared corpus by name and run scenarios read from stdin, in a separate interpreter
+ATTACH_SCRIPT = """
+import json, sys
+from cw_ngrams import SharedCorpus, run_scenarios
+corpus = SharedCorpus.attach(sys.argv[1])
+print(json.dumps(run_scenarios(json.load(sys.stdin), corpus=corpus)))
+corpus.close()
+"""
+
+# Non-ASCII letters make some affixes longer in bytes than in characters
+CORPUS = ["café", "cafés", "récit", "récits", "été", "étés", "caféine", "décidé", "idée", "idées"]
+
+# Non-ASCII letters have no CW weight, so these scenarios aren't weighted
+SCENARIOS = [
+    {"ngram_length": ngram_length, "n_affixes": 5, "n_examples": 1, **variant}
+    for ngram_length in [1, 2, 3]
+    for variant in [{}, {"prefixes": True}, {"suffixes": True, "sort": True}, {"difficulty": True}]
+]
+
+
+def test_attach_from_separate_processes(tmp_path):
+    """
+    Each worker is a separate interpreter with its own resource tracker; the corpus must outlive
+    the first worker, and stay usable until the publishing process unlinks it.
+    """
+
+    path = tmp_path / "corpus.txt"
+    path.write_text("".join(f"{word}\t{len(CORPUS) - i}\n" for i, word in enumerate(CORPUS)))
+    words, freqs = load_words_and_freqs(str(path))
+    expected = run_scenarios(SCENARIOS, str(path))
+    assert any(any(line.startswith("É") for line in output) for output in expected)
+
+    with SharedCorpus.publish(words, freqs, range(1, 3)) as corpus:
+        for _ in range(2):
+            result = subprocess.run(
+                [sys.executable, "-c", ATTACH_SCRIPT, corpus.name],
+                input=json.dumps(SCENARIOS),
+                capture_output=True,
+                text=True,
+                cwd=os.path.join(os.path.dirname(__file__), ".."),
+            )
+            assert result.returncode == 0, result.stderr
+            assert json.loads(result.stdout) == expected
+        assert run_scenarios(SCENARIOS, corpus=corpus) == expected